@@ -1,6 +1,7 @@
 import random
 import sys
-from utilities import get_configurations, get_obstacle_locations, get_start_states, get_target_states
+import numpy as np
+from tabular import TabularModel, tabular_qlearner, value_iteration
 
 width = 6
 height = 6
@@ -28,6 +29,11 @@ class GridWorld(object):
         self.success_prob = 1.0
         self.gamma = 0.9
         self.living_reward = -1.5
+        # Integer-indexed transition tables, built on first use
+        self.model = None
+        # Per-robot target rewards and (values, policy) pairs, keyed on robot positions
+        self.reward_cache = {}
+        self.policy_cache = {}
 
     """
     Calculate the reward of a target state (no longer a constant attribute)
@@ -95,44 +101,49 @@ class GridWorld(object):
         new_state = random.choices([i[0] for i in transitions], weights=[i[1] for i in transitions])
         return new_state[0]
 
-    def simple_policy_rollout(self, policy):
+    def simple_policy_rollout(self, policy, i = 0, max_steps = None):
         """
-        Return (Boolean indicating success of trial, total rewards) pair
+        Return (Boolean indicating success of trial, total rewards) pair for
+        robot i following policy from its start state
         """
-        state = self.initial_state
+        if max_steps is None:
+            max_steps = 4 * self.width * self.height
+        state = self.initial_state[i]
         rewards = 0
-        while True:
+        for step in range(max_steps):
             if state in self.targets:
-                return (True, rewards+self.target_reward)
+                break
             state = self.move(state, policy[state])
             rewards += self.living_reward
+        # The target reward counts even when it is reached on the last move
+        if state in self.targets:
+            return (True, rewards + self.get_reward(i, state))
+        return (False, rewards)
 
     def QValue_to_value(self, Qvalues):
         """
         Given a dictionary of q-values corresponding to (state, action) pairs,
-        return a dictionary of optimal values for each state
+        return a dictionary of optimal values for each state. Given one
+        robot's Q[state, action] array (as from tabular_Qlearner or
+        value_iteration), return the values as an array over the tabular
+        model's states instead.
         """
-        values = {}
-        for state in self.states:
-            values[state] = -float("inf")
-            for action in self.actions:
-                values[state] = max(values[state], Qvalues[(state, action)])
-        return values
+        if isinstance(Qvalues, np.ndarray):
+            return np.where(self.tabular_model().is_state, Qvalues.max(axis = 1), 0.0)
+        return {state: max(Qvalues[(state, action)] for action in self.actions)
+                for state in self.states}
 
     #### Some useful functions for you to visualize and test your MDP algorithms ###
 
-    def test_policy(self, policy, t = 500):
+    def test_policy(self, policy, t = 500, i = 0, seed = None):
         """
-        Following the policy t times, return (Rate of success, average total rewards)
+        Following robot i's policy t times, return (Rate of success, average total rewards).
+        The rollouts run together in evaluation.py; see evaluate_policy for
+        confidence intervals and episode lengths.
         """
-        numSuccess = 0.0
-        totalRewards = 0.0
-        for i in range(t):
-            result = self.simple_policy_rollout(policy)
-            if result[0]:
-                numSuccess += 1
-            totalRewards += result[1]
-        return (numSuccess / t, totalRewards / t)
+        from evaluation import evaluate_policy
+        summary = evaluate_policy(self, i, policy, t, seed = seed)
+        return (float(summary.success_rate), float(summary.mean_return))
 
     def gen_rand_set(width, height, size):
         """
@@ -206,25 +217,38 @@ class GridWorld(object):
 
     def extract_policy(self, i, values):
         """
-        Given state values, return the best policy.
+        Given state values, return the best policy. values is a dictionary
+        {state: value} or an array from QValue_to_value. The last policy per
+        robot and robot positions is memoized on the values object itself,
+        so pass new values rather than changing them in place.
         """
-        policy = {}
-        for state in values:
-            max_value = float("-inf")
-            for action in self.actions:
-                action_value = 0
-                for transition in self.get_transitions(state, action):
-                    reward = self.living_reward
-                    if(transition[0] in self.targets):
-                        action_value += transition[1] * (reward + (self.gamma * self.get_reward(i, transition[0])))
-                    else:
-                        action_value += transition[1] * (reward + (self.gamma * values[transition[0]]))
-
-                if(action_value >= max_value):
-                    max_value = action_value
-                    policy[state] = action
+        key = (i, tuple(self.current_state))
+        cached = self.policy_cache.get(key)
+        if cached is None or cached[0] is not values:
+            model = self.tabular_model()
+            if isinstance(values, np.ndarray):
+                states = [model.cells[s] for s in model.state_ids]
+                value_array = values
+            else:
+                states = list(values)
+                value_array = np.zeros(model.num_states)
+                value_array[[model.index(state) for state in states]] = list(values.values())
+            best = model.greedy_actions(model.action_values(value_array, self.target_rewards(i)))
+            if len(self.policy_cache) >= 256:
+                self.policy_cache.clear()
+            cached = self.policy_cache[key] = (values, {state: self.actions[best[model.index(state)]]
+                                                        for state in states})
+        return dict(cached[1])
 
-        return policy
+    def target_rewards(self, i):
+        """
+        Return get_reward(i, target) for every target as an array over the
+        tabular model's states, computed once per set of robot positions
+        """
+        key = (i, tuple(self.current_state))
+        if key not in self.reward_cache:
+            self.reward_cache[key] = self.tabular_model().target_rewards(i)
+        return self.reward_cache[key]
 
     def Qlearner(self, alpha, epsilon, num_trials):
         """
@@ -273,38 +297,47 @@ class GridWorld(object):
                 self.current_state[i] = self.initial_state[i][:] # Reset the robot location
             
             # Set the current position of the robot to its best target
-            learned_values = grid_world.QValue_to_value(Qvalues[i])
-            learned_policy = grid_world.extract_policy(i, learned_values)
+            learned_values = self.QValue_to_value(Qvalues[i])
+            learned_policy = self.extract_policy(i, learned_values)
             while(self.current_state[i] not in self.targets):
                 self.current_state[i] = self.move(self.current_state[i], learned_policy[self.current_state[i]])
 
         return Qvalues  
 
+    def tabular_model(self):
+        """
+        Return the TabularModel for this world (built once; the grid, targets
+        and transition parameters must not change afterwards)
+        """
+        if self.model is None:
+            self.model = TabularModel(self)
+        return self.model
+
+    def tabular_Qlearner(self, alpha, epsilon, num_trials, seed = None):
+        """
+        Array-based Qlearner: returns a NumPy array Q[robot, state, action],
+        with states numbered y * width + x (see TabularModel)
+        """
+        return tabular_qlearner(self, alpha, epsilon, num_trials, seed, self.tabular_model())[0]
+
+    def value_iteration(self, tolerance = 1e-6, max_iterations = 1000):
+        """
+        Exact alternative to Qlearner: returns Q[robot, state, action] like
+        tabular_Qlearner, solved by value iteration on the tabular model
+        """
+        return value_iteration(self, tolerance, max_iterations, self.tabular_model())[0]
+
 if __name__ == "__main__":
+    from generate_policies import make_tasks, generate, save_policies, report
+
     # NOTE: The distance of the goal states (T's) are determined by 'border_dist' below
     border_dist = 2 # Goal separation
     configuration_size = (2, 2)
 
-    for config in get_configurations(configuration_size):
-        """
-        Create a GridWorld simulation (NOTE: The world should be the same size as the
-        jammed configuration state).
-        
-        The map can be thought of as a cutout of the larger map in the D* Lite simulation.
-        """
-        width = configuration_size[0] + (2 * border_dist)
-        height = configuration_size[1] + (2 * border_dist)
-        start = get_start_states(config, border_dist)
-        targets = set(get_target_states(config, border_dist))
-        blocked = set(get_obstacle_locations(config, border_dist))
-        grid_world = GridWorld(width, height, start, targets, blocked)
-        
-        print("Original map:")
-        grid_world.print_map()
-
-        Qvalues = grid_world.Qlearner(alpha = 0.5, epsilon = 0.5, num_trials = 1000)
-        for i in range(len(Qvalues)):
-            learned_values = grid_world.QValue_to_value(Qvalues[i])
-            learned_policy = grid_world.extract_policy(i, learned_values)
-            print("Learned map for robot {}:".format(i + 1))
-            grid_world.print_map(learned_policy)
\ No newline at end of file
+    # Each configuration is trained in a separate process (see generate_policies.py);
+    # the GridWorld for a configuration is the jam with 'border_dist' free cells around
+    # it, a cutout of the larger map in the D* Lite simulation.
+    tasks = make_tasks(configuration_size, border_dist, alpha = 0.5, epsilon = 0.5,
+                       num_trials = 1000)
+    save_policies("policies.npz", generate(tasks), border_dist)
+    report("policies.npz")
@@ -0,0 +1,297 @@
+"""
+Monte Carlo evaluation of jam policies. Rollouts for many episodes (and many
+policies at once) advance together as NumPy arrays, with a step cap so that
+policies that loop are counted as failures instead of hanging.
+
+    python evaluation.py policies_3x3.npz --episodes 1000
+"""
+import argparse
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+
+# Every field is an array over the leading (policy) dimensions of the
+# rollouts; intervals are (low, high) pairs of such arrays
+EvaluationSummary = namedtuple('EvaluationSummary', [
+    'episodes', 'success_rate', 'success_ci',
+    'mean_return', 'return_ci', 'return_p5', 'return_p50', 'return_p95',
+    'mean_length', 'length_ci', 'length_p50', 'length_p95'])
+
+# Like EvaluationSummary, but for all robots of a jam stepping together
+JointSummary = namedtuple('JointSummary', [
+    'episodes', 'success_rate', 'success_ci', 'vertex_conflict_rate', 'swap_conflict_rate',
+    'timeout_rate', 'mean_makespan', 'makespan_ci', 'makespan_p50', 'makespan_p95'])
+
+def policy_actions(model, policy):
+    """
+    Convert a {cell: action} policy into per-state action indices (-1 where
+    the policy has no action)
+    """
+    actions = np.full(model.num_states, -1)
+    for cell, action in policy.items():
+        actions[model.index(cell)] = model.actions.index(action)
+    return actions
+
+def rollouts(next_state, cum_prob, actions, is_target, target_rewards, living_reward,
+             starts, num_episodes, max_steps, rng):
+    """
+    Run num_episodes rollouts of each of B policies. next_state and cum_prob
+    are TabularModel tensors stacked to (B, S, A, 4); actions, is_target and
+    target_rewards are (B, S); living_reward and starts are (B,).
+
+    An episode ends on reaching a target (earning its reward), on a state the
+    policy has no action for, or after max_steps moves. Returns (reached,
+    returns, lengths), each of shape (B, num_episodes); returns are
+    undiscounted, like simple_policy_rollout.
+    """
+    B, S, A = next_state.shape[:3]
+    flat_next = next_state.reshape(-1, 4)
+    flat_cum = cum_prob.reshape(-1, 4)
+    flat_actions = actions.ravel()
+    flat_target = is_target.ravel()
+
+    base = np.repeat(np.arange(B) * S, num_episodes)
+    s = np.repeat(starts, num_episodes)
+    lengths = np.zeros(len(s), dtype = np.int64)
+    # Episodes still running, compacted as they finish
+    live = np.flatnonzero(~flat_target[base + s])
+    for step in range(max_steps):
+        a = flat_actions[base[live] + s[live]]
+        live = live[a >= 0]
+        if not live.size:
+            break
+        outcomes = (base[live] + s[live]) * A + a[a >= 0]
+        cum = flat_cum[outcomes]
+        u = rng.random(len(live)) * cum[:, 3]
+        k = (cum[:, 0] <= u).astype(np.intp) + (cum[:, 1] <= u) + (cum[:, 2] <= u)
+        s[live] = flat_next[outcomes, k]
+        lengths[live] += 1
+        live = live[~flat_target[base[live] + s[live]]]
+
+    reached = flat_target[base + s]
+    returns = (lengths * np.repeat(living_reward, num_episodes) +
+               np.where(reached, target_rewards.ravel()[base + s], 0.0))
+    shape = (B, num_episodes)
+    return reached.reshape(shape), returns.reshape(shape), lengths.reshape(shape)
+
+def joint_rollouts(model, actions, starts, num_episodes, max_steps, rng):
+    """
+    Step every robot of one jam at the same time under its own policy.
+    actions is (R, S) per-robot action indices and starts the R start states.
+
+    A robot that reaches a target leaves the jam; one without an action
+    waits. An episode fails on the first vertex conflict (two robots entering
+    the same cell) or swap conflict (two robots trading cells), or when
+    max_steps ticks pass. Returns (succeeded, makespan, vertex, swap), each
+    of shape (num_episodes,); makespan is the tick the last robot left, or
+    the tick the episode stopped.
+    """
+    R, S = actions.shape
+    A = len(model.actions)
+    flat_next = model.next_state.reshape(-1, 4)
+    flat_cum = model.cum_prob.reshape(-1, 4)
+    robots = np.arange(R)
+    others = ~np.eye(R, dtype = bool)
+
+    s = np.tile(np.asarray(starts), (num_episodes, 1))
+    arrived = model.is_target[s]
+    vertex = np.zeros(num_episodes, dtype = bool)
+    swap = np.zeros(num_episodes, dtype = bool)
+    makespan = np.zeros(num_episodes, dtype = np.int64)
+    live = np.flatnonzero(~arrived.all(axis = 1))
+    for tick in range(1, max_steps + 1):
+        if not live.size:
+            break
+        old = s[live]
+        a = actions[robots, old]
+        moving = ~arrived[live] & (a >= 0)
+        outcomes = old * A + np.maximum(a, 0)
+        cum = flat_cum[outcomes]
+        u = rng.random(old.shape) * cum[..., 3]
+        k = (cum[..., 0] <= u).astype(np.intp) + (cum[..., 1] <= u) + (cum[..., 2] <= u)
+        new = np.where(moving, flat_next[outcomes, k], old)
+
+        # Only robots still in the jam can collide
+        present = ~arrived[live]
+        pairs = present[:, :, None] & present[:, None, :] & others
+        vertex[live] = (pairs & (new[:, :, None] == new[:, None, :])).any(axis = (1, 2))
+        swap[live] = (pairs & (new[:, :, None] == old[:, None, :]) &
+                      (old[:, :, None] == new[:, None, :]) &
+                      (new[:, :, None] != old[:, :, None])).any(axis = (1, 2))
+        s[live] = new
+        arrived[live] |= model.is_target[new]
+        makespan[live] = tick
+        live = live[~(vertex[live] | swap[live] | arrived[live].all(axis = 1))]
+
+    succeeded = arrived.all(axis = 1) & ~vertex & ~swap
+    return succeeded, makespan, vertex, swap
+
+def wilson_interval(successes, n, z):
+    p = successes / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    spread = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return (centre - spread, centre + spread)
+
+def normal_interval(samples, z):
+    mean = samples.mean(axis = -1)
+    spread = z * samples.std(axis = -1, ddof = 1) / np.sqrt(samples.shape[-1])
+    return (mean - spread, mean + spread)
+
+def summarize(reached, returns, lengths, confidence = 0.95):
+    """
+    Success rate (Wilson interval), return and episode length (normal
+    intervals on the mean, plus percentiles) along the last axis
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    n = reached.shape[-1]
+    p5, p50, p95 = np.percentile(returns, (5, 50, 95), axis = -1)
+    l50, l95 = np.percentile(lengths, (50, 95), axis = -1)
+    return EvaluationSummary(n, reached.mean(axis = -1), wilson_interval(reached.sum(axis = -1), n, z),
+                             returns.mean(axis = -1), normal_interval(returns, z), p5, p50, p95,
+                             lengths.mean(axis = -1), normal_interval(lengths, z), l50, l95)
+
+def summarize_joint(succeeded, makespan, vertex, swap, confidence = 0.95):
+    """
+    Success rate (Wilson interval), conflict and timeout rates, and makespan
+    of the successful episodes (nan if there are none)
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    n = len(succeeded)
+    spans = makespan[succeeded]
+    if len(spans) > 1:
+        span_ci = normal_interval(spans, z)
+    else:
+        span_ci = (float('nan'), float('nan'))
+    p50, p95 = np.percentile(spans, (50, 95)) if len(spans) else (float('nan'), float('nan'))
+    return JointSummary(n, succeeded.mean(), wilson_interval(succeeded.sum(), n, z),
+                        vertex.mean(), swap.mean(), (~succeeded & ~vertex & ~swap).mean(),
+                        spans.mean() if len(spans) else float('nan'), span_ci, p50, p95)
+
+def evaluate_joint(grid_world, policies, num_episodes = 1000, max_steps = None, seed = None,
+                   confidence = 0.95):
+    """
+    Run all robots from their start states together, robot i following
+    policies[i] (a {cell: action} dict or an array of action indices)
+    """
+    model = grid_world.tabular_model()
+    if max_steps is None:
+        max_steps = 4 * model.num_states
+    actions = np.array([policy_actions(model, p) if isinstance(p, dict) else p
+                        for p in policies], dtype = np.int64)
+    starts = [model.index(cell) for cell in grid_world.initial_state]
+    result = joint_rollouts(model, actions, starts, num_episodes, max_steps,
+                            np.random.default_rng(seed))
+    return summarize_joint(*result, confidence = confidence)
+
+def evaluate_policy(grid_world, i, policy, num_episodes = 1000, max_steps = None, seed = None,
+                    confidence = 0.95):
+    """
+    Evaluate robot i's {cell: action} policy from its start state, with
+    target rewards for the other robots' current positions
+    """
+    model = grid_world.tabular_model()
+    if max_steps is None:
+        max_steps = 4 * model.num_states
+    rng = np.random.default_rng(seed)
+    result = rollouts(model.next_state[None], model.cum_prob[None],
+                      policy_actions(model, policy)[None], model.is_target[None],
+                      grid_world.target_rewards(i)[None], np.array([grid_world.living_reward]),
+                      np.array([model.index(grid_world.initial_state[i])]),
+                      num_episodes, max_steps, rng)
+    return summarize(*[r[0] for r in result], confidence = confidence)
+
+def evaluate_file(path, num_episodes = 1000, max_steps = None, seed = None, confidence = 0.95):
+    """
+    Evaluate every robot policy in a generate_policies.py output file in one
+    batch, each from its robot's start with the other robots still in the
+    jam. Returns (configs, robots, summary), where configs and robots label
+    the rows of the summary arrays.
+    """
+    from generate_policies import make_grid_world
+
+    data = np.load(path)
+    border_dist = int(data['border_dist'])
+    configs, robots, rows, models, rewards, starts = [], [], [], [], [], []
+    for row, (config, num_robots) in enumerate(zip(data['configs'], data['num_robots'])):
+        grid_world = make_grid_world(str(config), border_dist)
+        model = grid_world.tabular_model()
+        for i in range(num_robots):
+            configs.append(str(config))
+            robots.append(i)
+            rows.append(row)
+            models.append(model)
+            rewards.append(grid_world.target_rewards(i))
+            starts.append(model.index(grid_world.initial_state[i]))
+    if max_steps is None:
+        max_steps = 4 * models[0].num_states
+    actions = data['policies'][np.array(rows), np.array(robots)]
+    rng = np.random.default_rng(seed)
+    result = rollouts(np.stack([m.next_state for m in models]),
+                      np.stack([m.cum_prob for m in models]), actions.astype(np.int64),
+                      np.stack([m.is_target for m in models]), np.stack(rewards),
+                      np.array([m.grid_world.living_reward for m in models]), np.array(starts),
+                      num_episodes, max_steps, rng)
+    return configs, robots, summarize(*result, confidence = confidence)
+
+def evaluate_joint_file(path, num_episodes = 1000, max_steps = None, seed = None,
+                        confidence = 0.95):
+    """
+    evaluate_joint for every configuration in a generate_policies.py output
+    file. Returns (configs, summaries).
+    """
+    from generate_policies import make_grid_world
+
+    data = np.load(path)
+    border_dist = int(data['border_dist'])
+    seed_seq = np.random.SeedSequence(seed)
+    configs, summaries = [], []
+    for config, num_robots, policies, child in zip(data['configs'], data['num_robots'],
+                                                   data['policies'],
+                                                   seed_seq.spawn(len(data['configs']))):
+        grid_world = make_grid_world(str(config), border_dist)
+        configs.append(str(config))
+        summaries.append(evaluate_joint(grid_world, policies[:num_robots], num_episodes,
+                                        max_steps, child, confidence))
+    return configs, summaries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Evaluate learned jam policies by simulation")
+    parser.add_argument('policy_file', help = "output of generate_policies.py")
+    parser.add_argument('--episodes', type = int, default = 1000)
+    parser.add_argument('--max-steps', type = int, default = None)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--worst', type = int, default = 10, help = "list the N least successful policies")
+    parser.add_argument('--joint', action = 'store_true',
+                        help = "run each jam's robots together and check for conflicts")
+    args = parser.parse_args()
+
+    if args.joint:
+        configs, summaries = evaluate_joint_file(args.policy_file, args.episodes,
+                                                 args.max_steps, args.seed)
+        rates = np.array([s.success_rate for s in summaries])
+        print("configurations: {}, episodes each: {}".format(len(configs), args.episodes))
+        print("mean joint success rate: {:.4f}".format(rates.mean()))
+        print("configurations always succeeding: {}".format((rates == 1).sum()))
+        for n in np.argsort(rates, kind = 'stable')[:args.worst]:
+            s = summaries[n]
+            print("{}: success {:.3f} [{:.3f}, {:.3f}], vertex {:.3f}, swap {:.3f}, "
+                  "timeout {:.3f}, makespan p50 {}".format(
+                      configs[n], s.success_rate, s.success_ci[0], s.success_ci[1],
+                      s.vertex_conflict_rate, s.swap_conflict_rate, s.timeout_rate,
+                      s.makespan_p50))
+    else:
+        configs, robots, summary = evaluate_file(args.policy_file, args.episodes, args.max_steps,
+                                                 args.seed)
+        print("policies: {}, episodes each: {}".format(len(configs), summary.episodes))
+        print("mean success rate: {:.4f}".format(summary.success_rate.mean()))
+        print("policies always reaching a target: {}".format((summary.success_rate == 1).sum()))
+        print("mean return: {:.3f}, mean episode length: {:.3f}".format(
+            summary.mean_return.mean(), summary.mean_length.mean()))
+        for n in np.argsort(summary.success_rate, kind = 'stable')[:args.worst]:
+            print("{} robot {}: success {:.3f} [{:.3f}, {:.3f}], return {:.2f} +/- {:.2f}, "
+                  "length p50 {:.0f} p95 {:.0f}".format(
+                      configs[n], robots[n] + 1, summary.success_rate[n], summary.success_ci[0][n],
+                      summary.success_ci[1][n], summary.mean_return[n],
+                      summary.mean_return[n] - summary.return_ci[0][n], summary.length_p50[n],
+                      summary.length_p95[n]))
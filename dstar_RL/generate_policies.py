@@ -0,0 +1,179 @@
+"""
+Learn policies for every jam configuration of a given size across all cores
+and save them to a single .npz file. Each configuration is trained in its own
+process with a seed derived from --seed, so the output does not depend on the
+number of workers. With --solver batched-qlearning, configurations are instead
+trained --batch-size at a time in one process, in lockstep (all configurations
+of one size share a map size); each still uses its own seed, so the output
+does not depend on --batch-size either. Maps are only printed afterwards, with
+--print.
+
+    python generate_policies.py --size 3 3 --output policies_3x3.npz --print
+    python generate_policies.py --size 3 3 --solver batched-qlearning --batch-size 32
+"""
+import argparse
+import os
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from dstar_RL import GridWorld
+from tabular import batched_qlearner
+from utilities import (iter_configurations, get_obstacle_locations, get_start_states,
+                       get_target_states)
+
+PolicyTask = namedtuple('PolicyTask', ['config', 'seed', 'border_dist', 'solver', 'alpha',
+                                       'epsilon', 'num_trials', 'tolerance'])
+
+SOLVERS = ('qlearning', 'value-iteration', 'batched-qlearning')
+
+# Q[robot, state, action] and the greedy action index of every state per robot
+# (-1 on targets and obstacles), states numbered y * width + x
+PolicyResult = namedtuple('PolicyResult', ['config', 'seed', 'width', 'height',
+                                           'starts', 'Q', 'policies'])
+
+def make_grid_world(config, border_dist):
+    """
+    Build the GridWorld for a configuration string: the jam surrounded by
+    border_dist free cells, with targets on the outer ring
+    """
+    lines = config.split(",_,")
+    width = len(lines) + 2 * border_dist
+    height = len(lines[0].split(",")) + 2 * border_dist
+    start = get_start_states(config, border_dist)
+    targets = set(get_target_states(config, border_dist))
+    blocked = set(get_obstacle_locations(config, border_dist))
+    return GridWorld(width, height, start, targets, blocked)
+
+def make_tasks(configuration_size, border_dist = 2, alpha = 0.5, epsilon = 0.5,
+               num_trials = 1000, base_seed = 0, solver = 'qlearning', tolerance = 1e-6):
+    if solver not in SOLVERS:
+        raise ValueError("Unknown solver {}".format(solver))
+    configs = sorted(iter_configurations(configuration_size))
+    seed_rng = random.Random(base_seed)
+    return [PolicyTask(config, seed_rng.getrandbits(63), border_dist, solver, alpha,
+                       epsilon, num_trials, tolerance)
+            for config in configs]
+
+def learn_policy(task):
+    grid_world = make_grid_world(task.config, task.border_dist)
+    if task.solver == 'value-iteration':
+        Q = grid_world.value_iteration(task.tolerance)
+    elif task.solver == 'batched-qlearning':
+        Q = batched_qlearner([grid_world], task.alpha, task.epsilon, task.num_trials,
+                             [task.seed])[0]
+    else:
+        Q = grid_world.tabular_Qlearner(task.alpha, task.epsilon, task.num_trials, task.seed)
+    return policy_result(task, grid_world, Q)
+
+def learn_batch(tasks):
+    """
+    Train a list of tasks with the same settings. batched-qlearning tasks (all
+    the same size) are trained together, each with its own seed; other
+    solvers train them one by one.
+    """
+    first = tasks[0]
+    if first.solver != 'batched-qlearning':
+        return [learn_policy(task) for task in tasks]
+    grid_worlds = [make_grid_world(task.config, task.border_dist) for task in tasks]
+    Q = batched_qlearner(grid_worlds, first.alpha, first.epsilon, first.num_trials,
+                         [task.seed for task in tasks])
+    return [policy_result(task, grid_world, Q[b, :len(grid_world.initial_state)])
+            for b, (task, grid_world) in enumerate(zip(tasks, grid_worlds))]
+
+def policy_result(task, grid_world, Q):
+    model = grid_world.tabular_model()
+
+    # Greedy policies against the robots' final positions, as extract_policy does
+    policies = np.full(Q.shape[:2], -1, dtype = np.int8)
+    for i in range(len(Q)):
+        values = np.where(model.is_state, Q[i].max(axis = 1), 0.0)
+        actions = model.greedy_actions(model.action_values(values, model.target_rewards(i)))
+        policies[i, model.state_ids] = actions[model.state_ids]
+    return PolicyResult(task.config, task.seed, grid_world.width, grid_world.height,
+                        list(grid_world.initial_state), Q, policies)
+
+def generate(tasks, max_workers = None, batch_size = 64):
+    """
+    Train tasks in a process pool and yield PolicyResults as they finish.
+    batched-qlearning tasks go to each process batch_size at a time.
+    """
+    if tasks and tasks[0].solver != 'batched-qlearning':
+        batch_size = 1
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(learn_batch, tasks[n:n + batch_size])
+                   for n in range(0, len(tasks), batch_size)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+def save_policies(path, results, border_dist):
+    """
+    Write results, sorted by configuration, to one .npz file. Q and policies
+    are padded to the largest robot count; num_robots gives the real count.
+    """
+    results = sorted(results, key = lambda r: r.config)
+    if not results:
+        raise ValueError("No policies to save")
+    width, height = results[0].width, results[0].height
+    actions = make_grid_world(results[0].config, border_dist).actions
+    max_robots = max(len(r.starts) for r in results)
+    S, A = results[0].Q.shape[1:]
+
+    Q = np.zeros((len(results), max_robots, S, A))
+    policies = np.full((len(results), max_robots, S), -1, dtype = np.int8)
+    starts = np.full((len(results), max_robots, 2), -1, dtype = np.int16)
+    for n, r in enumerate(results):
+        Q[n, :len(r.starts)] = r.Q
+        policies[n, :len(r.starts)] = r.policies
+        starts[n, :len(r.starts)] = r.starts
+    np.savez(path, configs = np.array([r.config for r in results]),
+             seeds = np.array([r.seed for r in results], dtype = np.uint64),
+             num_robots = np.array([len(r.starts) for r in results]),
+             starts = starts, Q = Q, policies = policies,
+             actions = np.array(actions), width = width, height = height,
+             border_dist = border_dist)
+
+def report(path):
+    """
+    Print the original and learned maps stored in a policy file
+    """
+    data = np.load(path)
+    actions = [str(a) for a in data['actions']]
+    border_dist = int(data['border_dist'])
+    for config, num_robots, policies in zip(data['configs'], data['num_robots'],
+                                            data['policies']):
+        grid_world = make_grid_world(str(config), border_dist)
+        print("Original map:")
+        grid_world.print_map()
+        for i in range(num_robots):
+            policy = {(s % grid_world.width, s // grid_world.width): actions[a]
+                      for s, a in enumerate(policies[i]) if a >= 0}
+            print("Learned map for robot {}:".format(i + 1))
+            grid_world.print_map(policy)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Learn policies for all jam configurations")
+    parser.add_argument('--size', type = int, nargs = 2, default = (2, 2))
+    parser.add_argument('--border', type = int, default = 2, help = "goal separation")
+    parser.add_argument('--solver', choices = SOLVERS, default = 'qlearning')
+    parser.add_argument('--alpha', type = float, default = 0.5)
+    parser.add_argument('--epsilon', type = float, default = 0.5)
+    parser.add_argument('--trials', type = int, default = 1000)
+    parser.add_argument('--tolerance', type = float, default = 1e-6,
+                        help = "value-iteration convergence threshold")
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--workers', type = int, default = os.cpu_count())
+    parser.add_argument('--batch-size', type = int, default = 64,
+                        help = "configurations trained together by batched-qlearning")
+    parser.add_argument('--output', default = 'policies.npz')
+    parser.add_argument('--print', action = 'store_true', help = "print the learned maps")
+    args = parser.parse_args()
+
+    tasks = make_tasks(tuple(args.size), args.border, args.alpha, args.epsilon,
+                       args.trials, args.seed, args.solver, args.tolerance)
+    save_policies(args.output, generate(tasks, args.workers, args.batch_size), args.border)
+    print("Saved {} configurations to {}".format(len(tasks), args.output))
+    if args.print:
+        report(args.output)
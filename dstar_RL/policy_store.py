@@ -0,0 +1,153 @@
+"""
+On-disk library of learned jam policies. Every policy is stored once, under
+the canonical (symmetry-reduced) configuration string, in a directory holding
+index.json and .npy arrays that are memory-mapped on load. A lookup for any
+jam -- including rotated or mirrored ones -- is a dictionary hit plus cached
+coordinate and action mappings back into the jam's own frame.
+
+    python policy_store.py policies_3x3.npz policies_3x3/
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from utilities import canonical_configuration, symmetries
+
+INDEX_FILE = 'index.json'
+ARRAYS = ('policies', 'starts', 'num_robots')
+
+def build_store(policy_file, directory):
+    """
+    Convert a generate_policies.py output file into a policy store directory
+    """
+    data = np.load(policy_file)
+    configs = [str(c) for c in data['configs']]
+    for config in configs:
+        if canonical_configuration(config)[0] != config:
+            raise ValueError("Configuration {} is not canonical".format(config))
+    os.makedirs(directory, exist_ok = True)
+    for name in ARRAYS:
+        np.save(os.path.join(directory, name + '.npy'), data[name])
+    index = {
+        'width': int(data['width']),
+        'height': int(data['height']),
+        'border_dist': int(data['border_dist']),
+        'actions': [str(a) for a in data['actions']],
+        'configs': {config: row for row, config in enumerate(configs)},
+    }
+    with open(os.path.join(directory, INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+
+class JamPolicy(object):
+    """
+    The stored policies of one canonical configuration, seen from the frame
+    of the jam that was looked up. Cells are GridWorld cells of that jam.
+    """
+    def __init__(self, store, config, row, frame):
+        self.store = store
+        self.config = config
+        self.row = row
+        self.to_canonical, self.to_query, self.action_map = frame
+        # Match robots by start cell: get_start_states orders them differently
+        # in the two frames
+        width = store.width
+        self.robots = {}
+        for r, (x, y) in enumerate(store.starts[row, :store.num_robots[row]]):
+            s = self.to_query[y * width + x]
+            self.robots[(int(s % width), int(s // width))] = r
+
+    def robot_index(self, start):
+        return self.robots[start]
+
+    def action(self, start, cell):
+        """
+        Action for the robot that started at 'start' when it is at 'cell', or
+        None where the policy has no action (targets and obstacles)
+        """
+        (x, y) = cell
+        s = self.to_canonical[y * self.store.width + x]
+        a = self.store.policies[self.row, self.robots[start], s]
+        if a < 0:
+            return None
+        return self.store.actions[self.action_map[a]]
+
+    def policy(self, start):
+        """
+        Return the {cell: action} policy of the robot that started at 'start',
+        in the same form as GridWorld.extract_policy
+        """
+        width = self.store.width
+        actions = self.store.policies[self.row, self.robots[start]]
+        return {(int(q % width), int(q // width)): self.store.actions[self.action_map[actions[s]]]
+                for s, q in enumerate(self.to_query) if actions[s] >= 0}
+
+class PolicyStore(object):
+    """
+    Read-only policy library. Arrays stay memory-mapped, so opening a store
+    costs little however many configurations it holds.
+    """
+    def __init__(self, directory):
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.width = index['width']
+        self.height = index['height']
+        self.border_dist = index['border_dist']
+        self.actions = tuple(index['actions'])
+        self.rows = index['configs']
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode = 'r'))
+        self.frames = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, config):
+        return canonical_configuration(config)[0] in self.rows
+
+    def frame(self, k):
+        """
+        Cell and action mappings between a jam and its canonical image under
+        transform k of symmetries(), computed once per transform
+        """
+        if k not in self.frames:
+            W, H = self.width, self.height
+            # World arrays are indexed [x, y], matching get_start_states
+            cells = np.arange(W * H).reshape(H, W).T
+            to_query = symmetries((W, H))[k](cells).T.ravel()
+            to_canonical = np.empty_like(to_query)
+            to_canonical[to_query] = np.arange(W * H)
+
+            # An action moves a canonical cell (x, y) by (dx, dy); see where
+            # that step goes in the jam's frame
+            steps = {'n': (0, -1), 's': (0, 1), 'e': (1, 0), 'w': (-1, 0)}
+            names = {step: a for a, step in steps.items()}
+            action_map = []
+            for a in self.actions:
+                (dx, dy) = steps[a]
+                (x, y) = (max(0, -dx), max(0, -dy))
+                q1 = to_query[y * W + x]
+                q2 = to_query[(y + dy) * W + x + dx]
+                step = (int(q2 % W - q1 % W), int(q2 // W - q1 // W))
+                action_map.append(self.actions.index(names[step]))
+            self.frames[k] = (to_canonical, to_query, np.array(action_map))
+        return self.frames[k]
+
+    def lookup(self, config):
+        """
+        Return the JamPolicy for a configuration string in any orientation;
+        raises KeyError if its class is not in the store
+        """
+        canonical, k = canonical_configuration(config)
+        return JamPolicy(self, canonical, self.rows[canonical], self.frame(k))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Build a policy store from generated policies")
+    parser.add_argument('policy_file', help = "output of generate_policies.py")
+    parser.add_argument('directory')
+    args = parser.parse_args()
+
+    build_store(args.policy_file, args.directory)
+    store = PolicyStore(args.directory)
+    print("Stored {} configurations in {}".format(len(store), args.directory))
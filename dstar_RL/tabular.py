@@ -0,0 +1,324 @@
+import random
+from bisect import bisect_right
+
+import numpy as np
+
+class TabularModel(object):
+    """
+    Integer-indexed view of a GridWorld. Every grid cell is a state, numbered
+    y * width + x, and the transition/probability tensors are built once from
+    GridWorld.get_transitions.
+    """
+
+    def __init__(self, grid_world):
+        self.grid_world = grid_world
+        self.width = grid_world.width
+        self.height = grid_world.height
+        self.actions = grid_world.actions
+        self.num_states = self.width * self.height
+        self.cells = [(x, y) for y in range(self.height) for x in range(self.width)]
+
+        self.is_state = np.zeros(self.num_states, dtype = bool)
+        self.is_target = np.zeros(self.num_states, dtype = bool)
+        for cell in grid_world.states:
+            self.is_state[self.index(cell)] = True
+        for cell in grid_world.targets:
+            self.is_target[self.index(cell)] = True
+        self.state_ids = np.flatnonzero(self.is_state)
+
+        # Up to 4 outcomes per (state, action): success, two slips, stay.
+        # Padding entries have probability 0 and point back at the state.
+        S, A, K = self.num_states, len(self.actions), 4
+        self.next_state = np.repeat(np.arange(S), A * K).reshape(S, A, K)
+        self.prob = np.zeros((S, A, K))
+        for s in self.state_ids:
+            for a, action in enumerate(self.actions):
+                for k, (successor, p) in enumerate(grid_world.get_transitions(self.cells[s], action)):
+                    self.next_state[s, a, k] = self.index(successor)
+                    self.prob[s, a, k] = p
+        self.cum_prob = self.prob.cumsum(axis = 2)
+        # Most likely successor of each (state, action)
+        self.primary = np.take_along_axis(self.next_state,
+                                          self.prob.argmax(axis = 2)[..., None], 2)[..., 0]
+
+    def index(self, cell):
+        (x, y) = cell
+        return y * self.width + x
+
+    def target_rewards(self, i):
+        """
+        Return get_reward(i, target) for every target cell (0 elsewhere),
+        for the current positions of the other robots
+        """
+        rewards = np.zeros(self.num_states)
+        for s in np.flatnonzero(self.is_target):
+            rewards[s] = self.grid_world.get_reward(i, self.cells[s])
+        return rewards
+
+    def allowed_actions(self, i):
+        """
+        Return a (states, actions) mask of the actions Qlearner's greedy step
+        may pick for robot i: the most likely successor must not be a cell
+        held by a robot, including staying put in its own cell
+        """
+        occupied = np.zeros(self.num_states, dtype = bool)
+        for j, cell in enumerate(self.grid_world.current_state):
+            if j != i:
+                occupied[self.index(cell)] = True
+        return ~occupied[self.primary] & (self.primary != np.arange(self.num_states)[:, None])
+
+    def action_values(self, values, target_rewards):
+        """
+        One-step lookahead: the expected return of every (state, action)
+        given state values and target rewards
+        """
+        world = self.grid_world
+        outcome = np.where(self.is_target, target_rewards, values)
+        return (self.prob * (world.living_reward + world.gamma * outcome[self.next_state])).sum(axis = 2)
+
+    def greedy_actions(self, action_values):
+        """
+        Index of the best action per state, taking the last action on ties
+        like GridWorld.extract_policy does
+        """
+        A = action_values.shape[1]
+        return A - 1 - action_values[:, ::-1].argmax(axis = 1)
+
+    def to_qvalues(self, Q):
+        """
+        Convert a (states, actions) array into the {(state, action): value}
+        dictionary used by GridWorld.QValue_to_value
+        """
+        return {(self.cells[s], action): float(Q[s, a])
+                for s in self.state_ids for a, action in enumerate(self.actions)}
+
+    def to_policy(self, actions):
+        """
+        Convert per-state action indices into a {state: action} policy
+        """
+        return {self.cells[s]: self.actions[actions[s]] for s in self.state_ids}
+
+def tabular_qlearner(grid_world, alpha, epsilon, num_trials, seed = None, model = None):
+    """
+    Same algorithm as GridWorld.Qlearner, on a dense Q[robot, state, action]
+    array and the precomputed transition tensor. Returns (Q, model).
+    """
+    if model is None:
+        model = TabularModel(grid_world)
+    rng = random.Random(seed)
+    num_robots = len(grid_world.initial_state)
+    A = len(model.actions)
+    Q = np.zeros((num_robots, model.num_states, A))
+    is_target = model.is_target.tolist()
+    next_state = model.next_state.tolist()
+    cum_prob = model.cum_prob.tolist()
+    living_reward, gamma = grid_world.living_reward, grid_world.gamma
+
+    for i in range(num_robots):
+        start = model.index(grid_world.initial_state[i])
+        target_rewards = model.target_rewards(i).tolist()
+        allowed = model.allowed_actions(i)
+        any_allowed = allowed.any(axis = 1).tolist()
+        masked = np.where(allowed, 0.0, -np.inf)
+        Qi = Q[i]
+
+        for j in range(num_trials):
+            s = start
+            while True:
+                if rng.random() < epsilon: # Explore
+                    a = rng.randrange(A)
+                elif any_allowed[s]:
+                    a = int((Qi[s] + masked[s]).argmax())
+                else:
+                    continue
+                k = bisect_right(cum_prob[s][a], rng.random() * cum_prob[s][a][-1])
+                s_new = next_state[s][a][min(k, 3)]
+                if is_target[s_new]:
+                    Qi[s, a] = (1 - alpha) * Qi[s, a] + alpha * (living_reward + gamma * target_rewards[s_new])
+                    break
+                Qi[s, a] = (1 - alpha) * Qi[s, a] + alpha * (living_reward + gamma * Qi[s_new].max())
+                s = s_new
+
+        # Fast-forward the robot to its best target before training the next one
+        values = np.where(model.is_state, Qi.max(axis = 1), 0.0)
+        policy = model.greedy_actions(model.action_values(values, model.target_rewards(i)))
+        s = start
+        while not is_target[s]:
+            a = policy[s]
+            k = bisect_right(cum_prob[s][a], rng.random() * cum_prob[s][a][-1])
+            s = next_state[s][a][min(k, 3)]
+        grid_world.current_state[i] = model.cells[s]
+
+    return Q, model
+
+def value_iteration(grid_world, tolerance = 1e-6, max_iterations = 1000, model = None):
+    """
+    Solve each robot's MDP exactly with synchronous Bellman backups, stopping
+    once no state value moves by more than tolerance (or after max_iterations
+    sweeps). Robots are handled in order like Qlearner, each moved to the
+    target its greedy policy reaches before the next is solved, so the
+    targets' rewards see the same robot positions. Returns (Q, model).
+    """
+    if model is None:
+        model = TabularModel(grid_world)
+    num_robots = len(grid_world.initial_state)
+    Q = np.zeros((num_robots, model.num_states, len(model.actions)))
+
+    for i in range(num_robots):
+        target_rewards = model.target_rewards(i)
+        values = np.zeros(model.num_states)
+        for iteration in range(max_iterations):
+            new_values = np.where(model.is_state, model.action_values(values, target_rewards).max(axis = 1), 0.0)
+            delta = np.abs(new_values - values).max()
+            values = new_values
+            if delta < tolerance:
+                break
+        Q[i] = model.action_values(values, target_rewards)
+
+        # Follow the most likely outcome of each greedy action to a target
+        policy = model.greedy_actions(Q[i])
+        s = model.index(grid_world.initial_state[i])
+        for step in range(model.num_states):
+            if model.is_target[s]:
+                break
+            s = model.primary[s, policy[s]]
+        grid_world.current_state[i] = model.cells[s]
+
+    return Q, model
+
+def mix64(x):
+    # splitmix64 finalizer on a uint64 array (wrapping arithmetic)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+class WorldStreams(object):
+    """
+    One random stream per world, drawn for every world at once. A world's
+    n-th draw depends only on its own seed and n, so what a world learns
+    does not depend on which other worlds share its batch. Draws are made
+    `block` at a time per world and handed out from a buffer.
+    """
+    block = 64
+
+    def __init__(self, seeds):
+        self.keys = mix64(np.asarray(seeds, dtype = np.uint64) + np.uint64(0x9E3779B97F4A7C15))
+        self.worlds = np.arange(len(self.keys))
+        # Draws used per world, and the count each world's buffer starts at
+        self.counts = np.zeros(len(self.keys), dtype = np.int64)
+        self.refill()
+
+    def refill(self):
+        self.start = self.counts.copy()
+        draws = (self.start + np.arange(self.block)[:, None]).astype(np.uint64)
+        x = mix64(self.keys + draws * np.uint64(0x9E3779B97F4A7C15))
+        self.buffer = (x >> np.uint64(11)) * (1.0 / (1 << 53))
+
+    def random(self, advance, n = 1):
+        # n floats in [0, 1) per world, shape (n, worlds); worlds where
+        # advance is set move on past them
+        offset = self.counts - self.start
+        if offset.max() + n > self.block:
+            self.refill()
+            offset = self.counts - self.start
+        u = self.buffer[offset + np.arange(n)[:, None], self.worlds]
+        self.counts += advance * n
+        return u
+
+def batched_qlearner(grid_worlds, alpha, epsilon, num_trials, seed = None):
+    """
+    Run tabular Q-learning on many GridWorlds of the same size in lockstep:
+    every tick advances one episode step in every environment with batched
+    array operations. The worlds may be different jams, or separate copies
+    of one jam to train with different random streams.
+
+    seed is either one seed per world, or a single seed (or None) from which
+    the per-world seeds are drawn. Each world has its own random stream, so
+    a world trained with seed s learns the same Q whatever its batch.
+
+    Robots are trained one at a time as in Qlearner (robot slot r in every
+    world that has one), each finishing at its best target before the next
+    slot is trained. Returns Q[world, robot, state, action]; slots past a
+    world's robot count stay zero.
+    """
+    models = [world.tabular_model() for world in grid_worlds]
+    if len({(m.width, m.height) for m in models}) != 1:
+        raise ValueError("All worlds in a batch must have the same size")
+    B = len(models)
+    if seed is None or np.isscalar(seed):
+        seed = np.random.SeedSequence(seed).generate_state(B, np.uint64)
+    streams = WorldStreams(seed)
+    S, A = models[0].num_states, len(models[0].actions)
+    envs = np.arange(B)
+    num_robots = np.array([len(world.initial_state) for world in grid_worlds])
+    is_target = np.stack([m.is_target for m in models])
+    is_state = np.stack([m.is_state for m in models])
+    living_reward = np.array([world.living_reward for world in grid_worlds])
+    gamma = np.array([world.gamma for world in grid_worlds])
+    Q = np.zeros((B, num_robots.max(), S, A))
+
+    # Everything per tick is gathered from flat (world * S + state) rows
+    row_base = envs * S
+    flat_is_target = is_target.ravel()
+    flat_next = np.stack([m.next_state for m in models]).reshape(-1, 4)
+    flat_cum = np.stack([m.cum_prob for m in models]).reshape(-1, 4)
+
+    def sample(rows, a, u):
+        outcomes = rows * A + a
+        cum = flat_cum[outcomes]
+        u = u * cum[:, 3]
+        k = (cum[:, 0] <= u).astype(np.intp) + (cum[:, 1] <= u) + (cum[:, 2] <= u)
+        return flat_next[outcomes, k]
+
+    for r in range(num_robots.max()):
+        has_robot = num_robots > r
+        start = np.array([m.index(world.initial_state[r]) if has_robot[b] else 0
+                          for b, (m, world) in enumerate(zip(models, grid_worlds))])
+        target_rewards = np.stack([m.target_rewards(r) if has_robot[b] else np.zeros(S)
+                                   for b, m in enumerate(models)])
+        allowed = np.stack([m.allowed_actions(r) if has_robot[b] else np.ones((S, A), dtype = bool)
+                            for b, m in enumerate(models)])
+        masked = np.where(allowed, 0.0, -np.inf).reshape(B * S, A)
+        any_allowed = allowed.any(axis = 2).ravel()
+        flat_targets = target_rewards.ravel()
+        Qr = np.zeros((B * S, A))
+
+        s = start.copy()
+        trials = np.where(has_robot, 0, num_trials)
+        running = trials < num_trials
+        while running.any():
+            rows = row_base + s
+            # Exploration, random action and transition draws
+            u = streams.random(running, 3)
+            explore = u[0] < epsilon
+            greedy = (Qr[rows] + masked[rows]).argmax(axis = 1)
+            a = np.where(explore, (u[1] * A).astype(np.intp), greedy)
+            # A greedy step with no allowed action is skipped, as in Qlearner
+            moving = running & (explore | any_allowed[rows])
+
+            s_new = sample(rows, a, u[2])
+            new_rows = row_base + s_new
+            reached = flat_is_target[new_rows]
+            outcome = np.where(reached, flat_targets[new_rows], Qr[new_rows].max(axis = 1))
+            update = Qr[rows, a] * (1 - alpha) + alpha * (living_reward + gamma * outcome)
+            Qr[rows[moving], a[moving]] = update[moving]
+
+            s = np.where(moving, np.where(reached, start, s_new), s)
+            trials += moving & reached
+            running = trials < num_trials
+        Q[:, r] = Qr = Qr.reshape(B, S, A)
+
+        # Fast-forward each robot to its best target before training the next slot
+        values = np.where(is_state, Qr.max(axis = 2), 0.0)
+        policy = np.stack([m.greedy_actions(m.action_values(values[b], target_rewards[b]))
+                           for b, m in enumerate(models)]).ravel()
+        s = start.copy()
+        done = ~has_robot | is_target[envs, s]
+        while not done.all():
+            rows = row_base + s
+            s = np.where(done, s, sample(rows, policy[rows], streams.random(~done)[0]))
+            done |= is_target[envs, s]
+        for b in np.flatnonzero(has_robot):
+            grid_worlds[b].current_state[r] = models[b].cells[s[b]]
+
+    return Q
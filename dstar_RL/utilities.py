@@ -58,6 +58,115 @@ def get_configurations(configuration_size):
     
     return(list(configurations))
 
+# Digit value of each symbol in the base-3 encoding used by iter_configurations
+SYMBOLS = ('X', 'o', 'r')
+ROBOT = SYMBOLS.index('r')
+
+def symmetries(shape):
+    """
+    Return the dihedral transforms that map an array with the given trailing
+    (rows, columns) shape onto the same shape: all 8 for a square, otherwise
+    the 4 that don't swap the axes.
+    """
+    transforms = [lambda a: a,
+                  lambda a: a[..., ::-1, :],
+                  lambda a: a[..., :, ::-1],
+                  lambda a: a[..., ::-1, ::-1]]
+    if shape[0] == shape[1]:
+        transforms += [lambda a, t=t: np.swapaxes(t(a), -1, -2) for t in transforms]
+    return transforms
+
+def config_to_string(grid):
+    """
+    Given a 2D array of symbol digits, return the configuration string
+    (rows separated by ',_,')
+    """
+    return ",_,".join(",".join(SYMBOLS[d] for d in row) for row in grid)
+
+def configs_to_strings(grids):
+    """
+    Vectorized config_to_string for a stack of equally sized digit arrays
+    """
+    count, rows, cols = grids.shape
+    template = config_to_string(np.zeros((rows, cols), dtype = np.int8)).encode()
+    chars = np.tile(np.frombuffer(template, dtype = np.uint8), (count, 1))
+    slots = np.frombuffer(template, dtype = np.uint8) == ord(SYMBOLS[0])
+    lookup = np.frombuffer("".join(SYMBOLS).encode(), dtype = np.uint8)
+    chars[:, slots] = lookup[grids.reshape(count, -1)]
+    return [row.decode() for row in chars.view("S{}".format(len(template))).ravel()]
+
+def string_to_config(config):
+    """
+    Inverse of config_to_string: return the 2D array of symbol digits
+    """
+    return np.array([[SYMBOLS.index(s) for s in line.split(",")]
+                     for line in config.split(",_,")], dtype = np.int8)
+
+def canonical_configuration(config):
+    """
+    Return (canonical, k): the representative of the configuration's symmetry
+    class that iter_configurations yields, and the index k of the transform in
+    symmetries() that maps the given configuration onto it
+    """
+    grid = string_to_config(config)
+    powers = 3 ** np.arange(grid.size - 1, -1, -1, dtype = np.int64)
+    transforms = symmetries(grid.shape)
+    codes = [int(t(grid).ravel().astype(np.int64) @ powers) for t in transforms]
+    k = codes.index(min(codes))
+    return config_to_string(transforms[k](grid)), k
+
+def iter_configurations(configuration_size, chunk_digits = 10):
+    """
+    Given a configuration size, yield one representative of every valid jam
+    configuration up to rotation/reflection, in the same string format as
+    get_configurations.
+
+    Configurations are handled as base-3 integer codes, 3 ** chunk_digits at a
+    time: robot adjacency is checked with array masks, and a code is kept
+    only if it is the smallest code of all its symmetric images, so every
+    class is yielded exactly once without remembering earlier ones.
+    """
+    shape = (configuration_size[1], configuration_size[0]) # (lines, entries per line)
+    size = shape[0] * shape[1]
+    powers = 3 ** np.arange(size - 1, -1, -1, dtype = np.int64)
+    transforms = symmetries(shape)
+
+    # The low digits run through the same table in every chunk; only the
+    # high digits change from one chunk to the next
+    low = min(size, chunk_digits)
+    high = size - low
+    low_codes = np.arange(3 ** low, dtype = np.int64)
+    low_digits = ((low_codes[:, None] // powers[high:]) % 3).astype(np.int8)
+
+    for high_code in range(3 ** high):
+        digits = np.empty((len(low_codes), size), dtype = np.int8)
+        digits[:, :high] = (high_code // 3 ** np.arange(high - 1, -1, -1)) % 3
+        digits[:, high:] = low_digits
+        codes = high_code * 3 ** low + low_codes
+        grids = digits.reshape(-1, *shape)
+
+        # Every robot needs at least one robot directly next to it
+        robots = grids == ROBOT
+        has_neighbour = np.zeros_like(robots)
+        has_neighbour[:, 1:, :] |= robots[:, :-1, :]
+        has_neighbour[:, :-1, :] |= robots[:, 1:, :]
+        has_neighbour[:, :, 1:] |= robots[:, :, :-1]
+        has_neighbour[:, :, :-1] |= robots[:, :, 1:]
+        valid = ((robots.sum(axis = (1, 2)) >= 2) &
+                 ~(robots & ~has_neighbour).any(axis = (1, 2)))
+        if not valid.any():
+            continue
+        grids = grids[valid]
+        codes = codes[valid]
+
+        # Keep only the canonical (smallest-code) member of each symmetry class
+        canonical = np.ones(len(codes), dtype = bool)
+        for transform in transforms[1:]:
+            images = transform(grids).reshape(len(codes), size).astype(np.int64)
+            canonical &= codes <= images @ powers
+        if canonical.any():
+            yield from configs_to_strings(grids[canonical])
+
 # Get the obstalce locations for a configuration
 def get_obstacle_locations(configuration, border_dist):
     """
@@ -99,4 +208,5 @@ def get_target_states(configuration, border_dist):
     return(targets)
 
 if __name__ == "__main__":
-    print(get_configurations((2, 2)))
\ No newline at end of file
+    print(get_configurations((2, 2)))
+    print(list(iter_configurations((2, 2))))
\ No newline at end of file
@@ -0,0 +1,158 @@
+from array import array
+from collections.abc import Mapping, MutableSet
+
+from grid import SquareGrid, AgentViewGrid
+
+# Neighbour order used by SquareGrid.neighbors, as (dx, dy) steps
+FOUR_STEPS = [(1, 0), (0, -1), (-1, 0), (0, 1)]
+EIGHT_STEPS = FOUR_STEPS + [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+class WallBitmap(MutableSet):
+    """
+    Set-of-(x, y) view over a one-byte-per-cell occupancy buffer, so code that
+    does `node in walls`, `walls.add(node)` or `seen - walls` keeps working.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cells = bytearray(width * height)
+        self.count = 0
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return set(it)
+
+    def __contains__(self, node):
+        (x, y) = node
+        return (0 <= x < self.width and 0 <= y < self.height and
+                self.cells[y * self.width + x] != 0)
+
+    def __iter__(self):
+        cells = self.cells
+        i = cells.find(1)
+        while i != -1:
+            yield (i % self.width, i // self.width)
+            i = cells.find(1, i + 1)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, node):
+        (x, y) = node
+        # Like discard, ignore cells off the grid rather than wrap them onto
+        # another row
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return
+        i = y * self.width + x
+        if not self.cells[i]:
+            self.cells[i] = 1
+            self.count += 1
+
+    def discard(self, node):
+        if node in self:
+            (x, y) = node
+            self.cells[y * self.width + x] = 0
+            self.count -= 1
+
+    def update(self, nodes):
+        if (isinstance(nodes, WallBitmap) and not self.count and
+                (nodes.width, nodes.height) == (self.width, self.height)):
+            # Taking over another bitmap wholesale is one buffer copy
+            self.cells[:] = nodes.cells
+            self.count = nodes.count
+            return
+        for node in nodes:
+            self.add(node)
+
+class CellMap(Mapping):
+    """
+    Read-only (x, y)-keyed view over a flat per-cell buffer. Cells holding
+    `empty` are treated as missing, like absent keys in the dict backend.
+    """
+    def __init__(self, grid, values, empty, decode = None):
+        self.grid = grid
+        self.values = values
+        self.empty = empty
+        self.decode = decode
+
+    def __getitem__(self, node):
+        if not self.grid.in_bounds(node):
+            raise KeyError(node)
+        value = self.values[self.grid.index(node)]
+        if value == self.empty:
+            raise KeyError(node)
+        return self.decode(value) if self.decode else value
+
+    def __iter__(self):
+        coords = self.grid.coords
+        empty = self.empty
+        for i, value in enumerate(self.values):
+            if value != empty:
+                yield coords(i)
+
+    def __len__(self):
+        empty = self.empty
+        return sum(1 for value in self.values if value != empty)
+
+    def copy(self):
+        return dict(self.items())
+
+class ArrayGrid(SquareGrid):
+    """
+    SquareGrid with walls in a flat bitmap indexed by y * width + x and a
+    precomputed neighbour-offset table. Besides the tuple API it exposes an
+    integer-index API (index, coords, neighbor_ids, cost_ids) used by
+    CompactDStarLite.
+    """
+    def __init__(self, width, height, eightway):
+        super().__init__(width, height, eightway)
+        self.size = width * height
+        self.walls = WallBitmap(width, height)
+        self.blocked = self.walls.cells
+
+        steps = EIGHT_STEPS if eightway else FOUR_STEPS
+        # (x + y) odd keeps SquareGrid's order, even reverses it
+        self._steps = (steps[::-1], steps)
+        self._offsets = tuple([dy * width + dx for (dx, dy) in s]
+                              for s in self._steps)
+
+    def agent_view(self):
+        return ArrayAgentViewGrid(self.width, self.height, self.eightway)
+
+    def index(self, node):
+        (x, y) = node
+        return y * self.width + x
+
+    def coords(self, i):
+        return (i % self.width, i // self.width)
+
+    def neighbor_ids(self, i):
+        (y, x) = divmod(i, self.width)
+        parity = (x + y) & 1
+        if 0 < x < self.width - 1 and 0 < y < self.height - 1:
+            return [i + o for o in self._offsets[parity]]
+        return [i + dy * self.width + dx for (dx, dy) in self._steps[parity]
+                if 0 <= x + dx < self.width and 0 <= y + dy < self.height]
+
+    def cost_ids(self, from_id, to_id):
+        if self.blocked[from_id] or self.blocked[to_id]:
+            return float('inf')
+        return 1
+
+    def heuristic_ids(self, a, b):
+        width = self.width
+        dx = abs(a % width - b % width)
+        dy = abs(a // width - b // width)
+        if self.eightway:
+            return dx if dx > dy else dy
+        return dx + dy
+
+    def neighbors(self, id):
+        coords = self.coords
+        return [coords(i) for i in self.neighbor_ids(self.index(id))]
+
+class ArrayAgentViewGrid(ArrayGrid, AgentViewGrid):
+    pass
+
+def cell_buffer(typecode, size, fill):
+    return array(typecode, [fill]) * size
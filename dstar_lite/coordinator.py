@@ -0,0 +1,111 @@
+"""
+Multi-robot D* Lite on one shared world. Every robot plans against the same
+ground-truth grid and the same map of known walls, which all robots' sensing
+feeds into; each robot keeps only its own search state (g, rhs, back-pointers
+and frontier). When sensing changes the known map, each changed cell is
+passed only to the searches that have evaluated it. With share_goals, robots
+heading to the same cell also share one search (see goal_field.py).
+"""
+from dstarlite import DStarLite, Step
+from goal_field import GOAL_FIELDS, GoalAgent
+
+class Coordinator(object):
+    """
+    Runs one planner per robot, or one per goal with share_goals, over a
+    single grid and a single known-walls map. Unlike building N planners with
+    N grid copies, a wall change costs one update to the shared map plus a
+    replan for the searches it can affect.
+    """
+    def __init__(self, graph, starts, goals, planner_class = DStarLite, view_range = 2,
+                 incremental = False, share_goals = False):
+        self.graph = graph
+        self.known = graph.agent_view()
+        # searches is a list of (search, robots using it)
+        if share_goals:
+            fields = {}
+            self.planners = []
+            for r, (start, goal) in enumerate(zip(starts, goals)):
+                if goal not in fields:
+                    fields[goal] = (GOAL_FIELDS[planner_class](graph, goal, view_range,
+                                                               known_graph = self.known), [])
+                fields[goal][1].append(r)
+                self.planners.append(GoalAgent(fields[goal][0], r, start, view_range,
+                                               incremental))
+            self.searches = list(fields.values())
+        else:
+            self.planners = [planner_class(graph, start, goal, view_range, incremental,
+                                           known_graph = self.known)
+                             for start, goal in zip(starts, goals)]
+            self.searches = [(dstar, [r]) for r, dstar in enumerate(self.planners)]
+        self.planned = False
+        # (search, changed cell) pairs passed to a search and left out
+        self.notified = self.skipped = 0
+
+    def positions(self):
+        return [dstar.position for dstar in self.planners]
+
+    def done(self):
+        return all(dstar.position == dstar.goal for dstar in self.planners)
+
+    def sense(self):
+        # Pool every robot's observation into the known map and return the
+        # cells whose known state changed
+        observation = {}
+        for dstar in self.planners:
+            dstar.observation = dstar.sense()
+            observation.update(dstar.observation)
+        added = self.known.new_walls(observation)
+        removed = self.known.freed_walls(observation)
+        self.known.update_walls(added, removed)
+        return added | removed
+
+    def initial_plan(self):
+        # Sense from every start before anyone plans, so no plan is built on
+        # a map that the other robots' first look is about to change.
+        # Returns the expanded count per robot (a shared search's count goes
+        # to its first robot).
+        self.sense()
+        expanded = [0] * len(self.planners)
+        for search, robots in self.searches:
+            search.compute_shortest_path(return_stats = True)
+            search.last_node = search.position
+            expanded[robots[0]] += search.last_expanded
+        self.planned = True
+        return expanded
+
+    def step(self):
+        """
+        Move every robot that is not at its goal one cell along its plan,
+        sense from the new positions and repair the plans that the changes
+        reach. Returns a Step for each robot that was not at its goal, in
+        robot order (like DStarLite.step, the first call also plans).
+        """
+        first = not self.planned
+        expanded = self.initial_plan() if first else [0] * len(self.planners)
+        replanned = [first] * len(self.planners)
+
+        active = [r for r, dstar in enumerate(self.planners) if dstar.position != dstar.goal]
+        active_set = set(active)
+        for r in active:
+            dstar = self.planners[r]
+            if dstar.g(dstar.position) == float('inf'):
+                raise Exception("No path")
+        for r in active:
+            dstar = self.planners[r]
+            dstar.position = dstar.lowest_cost_neighbour(dstar.position)
+
+        changed = self.sense()
+        for search, robots in self.searches:
+            robots = [r for r in robots if r in active_set]
+            if not robots:
+                continue
+            relevant = [node for node in changed if search.touched(node)]
+            self.notified += len(relevant)
+            self.skipped += len(changed) - len(relevant)
+            stats = (search.walls_changed(relevant) if relevant else None) or search.check_position()
+            if stats:
+                # A shared search's replan is counted once, for its first robot
+                replanned[robots[0]] = True
+                expanded[robots[0]] += stats.expanded
+        return [Step(self.planners[r].position, self.planners[r].observation, self.known.walls,
+                     replanned[r], expanded[r]) for r in active]
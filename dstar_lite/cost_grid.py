@@ -0,0 +1,70 @@
+from array import array
+from math import sqrt
+
+from grid import AgentViewGrid
+from array_grid import ArrayGrid
+
+SQRT2 = sqrt(2)
+
+class CostGrid(ArrayGrid):
+    """
+    ArrayGrid with a per-cell traversal cost. Moving between two cells costs
+    the mean of their costs, times sqrt(2) for a diagonal step, and the
+    heuristic is the matching octile (or Manhattan) distance scaled by the
+    cheapest cell cost, so it stays admissible and consistent.
+
+    Costs are part of the map the robots know up front: set them before
+    creating planners, since changing the cheapest cost afterwards would
+    change the heuristic under D* Lite's existing keys.
+    """
+    def __init__(self, width, height, eightway, costs = None, default_cost = 1.0):
+        super().__init__(width, height, eightway)
+        if costs is None:
+            costs = array('d', [default_cost]) * self.size
+        elif len(costs) != self.size:
+            raise ValueError("Expected {} cell costs, got {}".format(self.size, len(costs)))
+        self.costs = costs
+        self.min_cost = min(costs)
+        if self.min_cost <= 0:
+            raise ValueError("Cell costs must be positive")
+
+    def agent_view(self):
+        # Robots share the cost map but discover walls on their own
+        return CostAgentViewGrid(self.width, self.height, self.eightway, self.costs)
+
+    def set_cost(self, node, cost):
+        if cost <= 0:
+            raise ValueError("Cell costs must be positive")
+        self.costs[self.index(node)] = cost
+        self.min_cost = min(self.min_cost, cost)
+
+    def cell_cost(self, node):
+        return self.costs[self.index(node)]
+
+    def cost(self, from_node, to_node):
+        return self.cost_ids(self.index(from_node), self.index(to_node))
+
+    def cost_ids(self, from_id, to_id):
+        if self.blocked[from_id] or self.blocked[to_id]:
+            return float('inf')
+        cost = (self.costs[from_id] + self.costs[to_id]) / 2
+        width = self.width
+        if from_id % width != to_id % width and from_id // width != to_id // width:
+            return cost * SQRT2
+        return cost
+
+    def heuristic(self, a, b):
+        return self.heuristic_ids(self.index(a), self.index(b))
+
+    def heuristic_ids(self, a, b):
+        width = self.width
+        dx = abs(a % width - b % width)
+        dy = abs(a // width - b // width)
+        if self.eightway:
+            if dx < dy:
+                dx, dy = dy, dx
+            return self.min_cost * (dx + (SQRT2 - 1) * dy)
+        return self.min_cost * (dx + dy)
+
+class CostAgentViewGrid(CostGrid, AgentViewGrid):
+    pass
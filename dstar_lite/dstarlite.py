@@ -1,23 +1,50 @@
-from collections import deque
+from collections import deque, namedtuple
 from functools import partial
 
-from priority_queue import PriorityQueue
-from grid import AgentViewGrid, SquareGrid
+from priority_queue import IndexedPriorityQueue
+from grid import SquareGrid, WindowSensor
+from array_grid import CellMap, cell_buffer
+
+# Result of DStarLite.step(): where the robot is, what it saw, the walls it
+# knows about, and whether (and how hard) it had to replan on the way there
+Step = namedtuple('Step', ['position', 'observation', 'walls', 'replanned', 'expanded'])
+# What compute_shortest_path(return_stats = True) reports instead of copies
+PlanStats = namedtuple('PlanStats', ['expanded', 'frontier_size'])
 
 class DStarLite(object):
-    def __init__(self, graph, start, goal, view_range = 2):
-        # Init the graphs
-        self.graph = AgentViewGrid(graph.width, graph.height, graph.eightway)
+    def __init__(self, graph, start, goal, view_range = 2, incremental = False,
+                 known_graph = None):
+        # Init the graphs. graph is the ground truth; self.graph holds the
+        # walls known so far and may be shared with other planners (see
+        # coordinator.py)
+        self.graph = known_graph if known_graph is not None else graph.agent_view()
         self.real_graph: SquareGrid = graph
         self.view_range = view_range
+        # With incremental sensing each observation only holds the cells that
+        # came into view or changed since the previous one
+        self.sensor = WindowSensor(graph, view_range) if incremental else None
 
-        self.back_pointers = {}
-        self.G_VALS = {}
-        self.RHS_VALS = {}
         self.Km = 0
         self.position = start
         self.goal = goal
-        self.frontier = PriorityQueue()
+        self.init_search()
+
+        # State carried between step() calls
+        self.last_node = None
+        self.observation = None
+        self.last_expanded = 0
+        # Bumped whenever g/rhs/back-pointers may have changed
+        self.plan_version = 0
+        # start -> path for the current plan_version; a shared goal field
+        # serves one entry per robot
+        self.path_cache = {}
+        self.path_cache_version = 0
+
+    def init_search(self):
+        self.back_pointers = {}
+        self.G_VALS = {}
+        self.RHS_VALS = {}
+        self.frontier = IndexedPriorityQueue()
         self.frontier.put(self.goal, self.calculate_key(self.goal))
         self.back_pointers[self.goal] = None
 
@@ -40,9 +67,7 @@ class DStarLite(object):
         return self.RHS_VALS.get(node, float('inf')) if node != self.goal else 0
 
     def heuristic(self, a, b):
-        (x1, y1) = a
-        (x2, y2) = b
-        return abs(x1 - x2) + abs(y1 - y2)
+        return self.graph.heuristic(a, b)
 
     def calculate_key(self, node):
         g_rhs = min([self.g(node), self.rhs(node)])
@@ -60,15 +85,18 @@ class DStarLite(object):
             self.frontier.put(node, self.calculate_key(node))
 
     def update_nodes(self, nodes):
+        self.plan_version += 1
         [self.update_node(n) for n in nodes]
 
-    def compute_shortest_path(self):
+    def compute_shortest_path(self, return_stats = False):
         last_nodes = deque(maxlen=10)
+        expanded = 0
         while(self.frontier.first_key() < self.calculate_key(self.position) or
               self.rhs(self.position) != self.g(self.position)):
             
             k_old = self.frontier.first_key()
             node = self.frontier.pop()
+            expanded += 1
             last_nodes.append(node)
             if len(last_nodes) == 10 and len(set(last_nodes)) < 3:
                 raise Exception("Fail! Stuck in a loop")
@@ -82,32 +110,276 @@ class DStarLite(object):
                 self.G_VALS[node] = float('inf')
                 self.update_nodes(self.graph.neighbors(node) + [node])
 
+        self.last_expanded = expanded
+        if expanded:
+            self.plan_version += 1
+        if return_stats:
+            return PlanStats(expanded, len(self.frontier))
         return self.back_pointers.copy(), self.G_VALS.copy()
 
-    def move_to_goal(self):
-        observation = self.real_graph.observe(self.position, self.view_range)
-        walls = self.graph.new_walls(observation)
-        self.graph.update_walls(walls)
+    def current_path(self, start = None):
+        # Nodes from (excluding) the current position, or start, up to the
+        # goal, rebuilt only when the plan has changed since the last call
+        # from that start
+        node = self.position if start is None else start
+        if self.path_cache_version != self.plan_version:
+            self.path_cache = {}
+            self.path_cache_version = self.plan_version
+        elif node in self.path_cache:
+            return self.path_cache[node]
+        start = node
+
+        path = []
+        if self.g(node) != float('inf'):
+            limit = self.graph.width * self.graph.height
+            while node != self.goal and len(path) < limit:
+                node = self.back_pointers[node]
+                path.append(node)
+        path = tuple(path)
+        self.path_cache[start] = path
+        return path
+
+    def sense(self):
+        if self.sensor:
+            return self.sensor.observe(self.position)
+        return self.real_graph.observe(self.position, self.view_range)
+
+    def update_walls(self, added = (), removed = ()):
+        # Apply a batch of newly blocked and newly freed cells with a single
+        # Km adjustment and a single replan. Returns None if nothing changed.
+        added = set(added) - self.graph.walls
+        removed = {node for node in removed if node in self.graph.walls}
+        if not added and not removed:
+            return None
+
+        self.graph.update_walls(added, removed)
+        return self.walls_changed(added | removed)
+
+    def walls_changed(self, nodes):
+        # Repair the plan after the walls at nodes changed on self.graph,
+        # whoever changed them
+        self.advance_km()
+        self.update_nodes({node for wallnode in nodes
+                           for node in self.graph.neighbors(wallnode) + [wallnode]
+                           if node not in self.graph.walls})
+        return self.compute_shortest_path(return_stats = True)
+
+    def touched(self, node):
+        # Whether the search has ever evaluated node. A wall change anywhere
+        # the search has not been cannot change g, rhs or the path.
+        return node in self.back_pointers
 
-        self.compute_shortest_path()
-        last_node = self.position
+    def initial_plan(self):
+        # Sense and plan from the start position; step() does this on its
+        # first call. Returns the number of expanded nodes.
+        self.observation = self.sense()
+        self.graph.update_walls(self.graph.new_walls(self.observation))
+        self.compute_shortest_path(return_stats = True)
+        self.last_node = self.position
+        return self.last_expanded
 
+    def next_position(self):
+        # The neighbour the current plan moves to, or None if there is no path
+        if self.position == self.goal or self.g(self.position) == float('inf'):
+            return None
+        return self.lowest_cost_neighbour(self.position)
+
+    def move_to(self, node):
+        # Move to an adjacent cell (usually next_position(), but any neighbour
+        # works), sense and repair the plan. Returns PlanStats, or None if
+        # nothing had to be replanned.
+        self.position = node
+        self.observation = self.sense()
+        stats = self.update_walls(self.graph.new_walls(self.observation),
+                                  self.graph.freed_walls(self.observation))
+        return stats or self.check_position()
+
+    def check_position(self):
+        # Replan if the world changed under a cell we had already committed
+        # to, or the robot was moved off its planned path
+        g = self.g(self.position)
+        if g == float('inf') or self.rhs(self.position) != g:
+            self.advance_km()
+            return self.compute_shortest_path(return_stats = True)
+        return None
+
+    def advance_km(self):
+        # Keys already in the frontier used the heuristic from last_node;
+        # adding the distance moved since then to Km keeps them lower bounds
+        # of the keys computed from here. Before the first step() nothing
+        # has moved, and last_node must stay None so step() still plans.
+        if self.last_node is None:
+            return
+        self.Km += self.heuristic(self.last_node, self.position)
+        self.last_node = self.position
+
+    def step(self):
+        # The first call senses and plans from the start; later calls make
+        # one move and only replan if that move revealed changed walls
+        if self.last_node is None:
+            replanned, expanded = True, self.initial_plan()
+        else:
+            replanned, expanded = False, 0
+
+        if self.position == self.goal:
+            return Step(self.position, self.observation, self.graph.walls, replanned, expanded)
+        if self.g(self.position) == float('inf'):
+            raise Exception("No path")
+
+        stats = self.move_to(self.lowest_cost_neighbour(self.position))
+        if stats:
+            replanned, expanded = True, expanded + stats.expanded
+        return Step(self.position, self.observation, self.graph.walls, replanned, expanded)
+
+    def move_to_goal(self):
         while self.position != self.goal:
-            if self.g(self.position) == float('inf'):
-                raise Exception("No path")
-
-            self.position = self.lowest_cost_neighbour(self.position)
-            observation = self.real_graph.observe(self.position, self.view_range)
-            new_walls = self.graph.new_walls(observation)
-
-            if new_walls:
-                self.graph.update_walls(new_walls)
-                self.Km += self.heuristic(last_node, self.position)
-                last_node = self.position
-                self.update_nodes({node for wallnode in new_walls
-                                   for node in self.graph.neighbors(wallnode)
-                                   if node not in self.graph.walls})
-                self.compute_shortest_path()
-            yield self.position, observation, self.graph.walls
-        
-        yield self.position, observation, self.graph.walls
\ No newline at end of file
+            yield self.step()[:3]
+        self.step()
+        yield self.position, self.observation, self.graph.walls
+
+NO_BACK_POINTER = -2
+
+class CompactDStarLite(DStarLite):
+    """
+    DStarLite over an ArrayGrid. g, rhs and back-pointers live in flat buffers
+    indexed by y * width + x and the search loop works on integer cell ids;
+    the public methods still take and return (x, y) tuples.
+    """
+    def init_search(self):
+        size = self.graph.size
+        self.G = cell_buffer('d', size, float('inf'))
+        self.RHS = cell_buffer('d', size, float('inf'))
+        self.BP = cell_buffer('i', size, -1)
+        self.G_VALS = CellMap(self.graph, self.G, float('inf'))
+        self.RHS_VALS = CellMap(self.graph, self.RHS, float('inf'))
+        self.back_pointers = CellMap(self.graph, self.BP, -1, self._decode_bp)
+        self.frontier = IndexedPriorityQueue()
+        self.frontier.put(self.goal_id, self._key(self.goal_id))
+        # -1 marks a missing back-pointer, NO_BACK_POINTER a None one (the
+        # goal's, or a cell with no neighbours)
+        self.BP[self.goal_id] = NO_BACK_POINTER
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, node):
+        self._position = node
+        self.position_id = self.graph.index(node)
+
+    @property
+    def goal(self):
+        return self._goal
+
+    @goal.setter
+    def goal(self, node):
+        self._goal = node
+        self.goal_id = self.graph.index(node)
+
+    def _decode_bp(self, i):
+        return None if i == NO_BACK_POINTER else self.graph.coords(i)
+
+    # Integer-id internals
+
+    def _rhs(self, i):
+        return 0 if i == self.goal_id else self.RHS[i]
+
+    def _h(self, a, b):
+        return self.graph.heuristic_ids(a, b)
+
+    def _key(self, i):
+        g = self.G[i]
+        rhs = 0 if i == self.goal_id else self.RHS[i]
+        g_rhs = g if g < rhs else rhs
+        return (g_rhs + self._h(i, self.position_id) + self.Km, g_rhs)
+
+    def _lowest(self, i):
+        G = self.G
+        cost = self.graph.cost_ids
+        best, best_cost = NO_BACK_POINTER, float('inf')
+        for n in self.graph.neighbor_ids(i):
+            c = G[n] + cost(n, i)
+            if best == NO_BACK_POINTER or c < best_cost:
+                best, best_cost = n, c
+        return best, best_cost
+
+    def _update(self, i):
+        if i != self.goal_id:
+            best, best_cost = self._lowest(i)
+            self.BP[i] = best
+            self.RHS[i] = best_cost
+        self.frontier.delete(i)
+        if self.G[i] != self._rhs(i):
+            self.frontier.put(i, self._key(i))
+
+    # Tuple API
+
+    def g(self, node):
+        return self.G[self.graph.index(node)]
+
+    def rhs(self, node):
+        return self._rhs(self.graph.index(node))
+
+    def calculate_key(self, node):
+        return self._key(self.graph.index(node))
+
+    def calculate_rhs(self, node):
+        i = self.graph.index(node)
+        best, best_cost = self._lowest(i)
+        self.BP[i] = best
+        return best_cost
+
+    def lookahead_cost(self, node, neighbour):
+        index = self.graph.index
+        return self.G[index(neighbour)] + self.graph.cost_ids(index(neighbour), index(node))
+
+    def lowest_cost_neighbour(self, node):
+        return self._decode_bp(self._lowest(self.graph.index(node))[0])
+
+    def update_node(self, node):
+        self._update(self.graph.index(node))
+
+    def update_nodes(self, nodes):
+        self.plan_version += 1
+        index = self.graph.index
+        for n in nodes:
+            self._update(index(n))
+
+    def compute_shortest_path(self, return_stats = False):
+        G = self.G
+        frontier = self.frontier
+        neighbor_ids = self.graph.neighbor_ids
+        update = self._update
+        start = self.position_id
+        last_nodes = deque(maxlen=10)
+        expanded = 0
+        while(frontier.first_key() < self._key(start) or
+              self._rhs(start) != G[start]):
+
+            k_old = frontier.first_key()
+            node = frontier.pop()
+            expanded += 1
+            last_nodes.append(node)
+            if len(last_nodes) == 10 and len(set(last_nodes)) < 3:
+                raise Exception("Fail! Stuck in a loop")
+            k_new = self._key(node)
+            if k_old < k_new:
+                frontier.put(node, k_new)
+            elif G[node] > self._rhs(node):
+                G[node] = self._rhs(node)
+                for n in neighbor_ids(node):
+                    update(n)
+            else:
+                G[node] = float('inf')
+                for n in neighbor_ids(node):
+                    update(n)
+                update(node)
+
+        self.last_expanded = expanded
+        if expanded:
+            self.plan_version += 1
+        if return_stats:
+            return PlanStats(expanded, len(frontier))
+        # Live read-only views; copying them would cost O(width * height)
+        return self.back_pointers, self.G_VALS
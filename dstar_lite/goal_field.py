@@ -0,0 +1,163 @@
+"""
+One backward D* Lite search per goal, shared by every robot heading there.
+D* Lite searches from the goal, so its g-values are a cost-to-goal field
+that does not depend on where the robots are; only the keys do. A GoalField
+keys its frontier with the heuristic to the nearest subscribed robot and
+keeps expanding until every robot's cell is consistent, so one search (and
+one repair per wall change) serves all of them.
+
+This pays off when many robots head for the same cell. With only a few per
+goal, spread around the map, one search focused on all of them can expand
+more than separate searches would.
+"""
+from dstarlite import DStarLite, CompactDStarLite, PlanStats
+from grid import WindowSensor
+
+class SharedGoalSearch(object):
+    """
+    Mixin turning a D* Lite planner class into a goal field. Robots are
+    subscribed by id with their position and moved with move_agent.
+
+    The heuristic min over robots of h(node, robot) stays consistent, so the
+    usual correctness argument holds for every robot at once. When robots
+    move, no key in the frontier can drop by more than the longest distance
+    any one robot moved, so that is what Km grows by (the single-robot rule,
+    taken over the team). A new robot can make the heuristic drop anywhere,
+    so subscribing re-keys the frontier.
+    """
+    def __init__(self, graph, goal, view_range = 2, known_graph = None):
+        # robot -> position now, and at the last Km adjustment
+        self.agents = {}
+        self.last_positions = {}
+        self.agent_positions = ()
+        self.nearest = {}
+        super().__init__(graph, goal, goal, view_range, known_graph = known_graph)
+
+    def subscribe(self, robot, position):
+        self.agents[robot] = position
+        self.last_positions[robot] = position
+        self.positions_changed()
+        self.rekey()
+
+    def unsubscribe(self, robot):
+        # A robot leaving can only raise the heuristic; old keys stay valid
+        self.agents.pop(robot, None)
+        self.last_positions.pop(robot, None)
+        self.positions_changed()
+
+    def move_agent(self, robot, position):
+        self.agents[robot] = position
+        self.positions_changed()
+
+    def positions_changed(self):
+        self.agent_positions = tuple(set(self.agents.values()))
+        # node -> heuristic to the nearest robot, valid until robots move
+        self.nearest = {}
+
+    def advance_km(self):
+        self.Km += max([self.heuristic(self.last_positions[r], p) for r, p in self.agents.items()],
+                       default = 0)
+        self.last_positions = dict(self.agents)
+
+    def compute_shortest_path(self, return_stats = False):
+        # Run the usual loop once per robot cell; cells made consistent by an
+        # earlier pass stay that way, so later passes only do the extra work
+        expanded = 0
+        for position in self.agent_positions:
+            self.position = position
+            expanded += super().compute_shortest_path(return_stats = True).expanded
+        self.last_expanded = expanded
+        return PlanStats(expanded, len(self.frontier))
+
+    def check_position(self):
+        # Replan if any robot's cell is no longer consistent
+        for position in self.agent_positions:
+            g = self.g(position)
+            if g == float('inf') or self.rhs(position) != g:
+                self.advance_km()
+                return self.compute_shortest_path(return_stats = True)
+        return None
+
+class GoalField(SharedGoalSearch, DStarLite):
+    def calculate_key(self, node):
+        g_rhs = min(self.g(node), self.rhs(node))
+        h = self.nearest.get(node)
+        if h is None:
+            heuristic = self.graph.heuristic
+            h = self.nearest[node] = min([heuristic(node, p) for p in self.agent_positions],
+                                         default = 0)
+        return (g_rhs + h + self.Km, g_rhs)
+
+    def rekey(self):
+        for node in self.frontier:
+            self.frontier.put(node, self.calculate_key(node))
+
+class CompactGoalField(SharedGoalSearch, CompactDStarLite):
+    # Flat indices of agent_positions (none while the search is set up)
+    agent_ids = ()
+
+    def positions_changed(self):
+        super().positions_changed()
+        self.agent_ids = tuple(self.graph.index(p) for p in self.agent_positions)
+
+    def _key(self, i):
+        g = self.G[i]
+        rhs = 0 if i == self.goal_id else self.RHS[i]
+        g_rhs = g if g < rhs else rhs
+        h = self.nearest.get(i)
+        if h is None:
+            heuristic = self.graph.heuristic_ids
+            h = self.nearest[i] = min([heuristic(i, p) for p in self.agent_ids], default = 0)
+        return (g_rhs + h + self.Km, g_rhs)
+
+    def rekey(self):
+        for i in self.frontier:
+            self.frontier.put(i, self._key(i))
+
+# Goal field class for each planner class in simulation.BACKENDS
+GOAL_FIELDS = {DStarLite: GoalField, CompactDStarLite: CompactGoalField}
+
+class GoalAgent(object):
+    """
+    One robot's handle on a GoalField, with the parts of the planner
+    interface that Coordinator, the renderer and simulation.py use.
+    """
+    def __init__(self, field, robot, start, view_range = 2, incremental = False):
+        self.field = field
+        self.robot = robot
+        self.real_graph = field.real_graph
+        self.view_range = view_range
+        self.sensor = WindowSensor(self.real_graph, view_range) if incremental else None
+        self.observation = None
+        self._position = start
+        field.subscribe(robot, start)
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, node):
+        self._position = node
+        if node == self.field.goal:
+            self.field.unsubscribe(self.robot)
+        else:
+            self.field.move_agent(self.robot, node)
+
+    @property
+    def goal(self):
+        return self.field.goal
+
+    def g(self, node):
+        return self.field.g(node)
+
+    def lowest_cost_neighbour(self, node):
+        return self.field.lowest_cost_neighbour(node)
+
+    def current_path(self):
+        return self.field.current_path(self._position)
+
+    def sense(self):
+        if self.sensor:
+            return self.sensor.observe(self._position)
+        return self.real_graph.observe(self._position, self.view_range)
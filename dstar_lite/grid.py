@@ -1,3 +1,5 @@
+import weakref
+
 WALL = '#'
 PASSABLE = '.'
 
@@ -7,6 +9,46 @@ class SquareGrid:
         self.height = height
         self.walls = set()
         self.eightway = eightway
+        # (node, is_wall) for changes made through add_walls/remove_walls, so
+        # sensors can pick up edits inside a window they already looked at.
+        # Only changes some watching reader has not read yet are kept;
+        # changes[0] is change number changes_base.
+        self.changes = []
+        self.changes_base = 0
+        # reader -> number of the next change it will read
+        self.change_readers = weakref.WeakKeyDictionary()
+
+    def agent_view(self):
+        return AgentViewGrid(self.width, self.height, self.eightway)
+
+    def add_walls(self, nodes):
+        for node in nodes:
+            if node not in self.walls:
+                self.walls.add(node)
+                if self.change_readers:
+                    self.changes.append((node, True))
+
+    def remove_walls(self, nodes):
+        for node in nodes:
+            if node in self.walls:
+                self.walls.discard(node)
+                if self.change_readers:
+                    self.changes.append((node, False))
+
+    def watch_changes(self, reader):
+        # Start logging changes for reader, from now on
+        self.change_readers[reader] = self.changes_base + len(self.changes)
+
+    def read_changes(self, reader):
+        # The changes made since reader's last read (or watch_changes call).
+        # Changes that every reader has now read are dropped.
+        readers = self.change_readers
+        changes = self.changes[readers[reader] - self.changes_base:]
+        readers[reader] = self.changes_base + len(self.changes)
+        oldest = min(readers.values())
+        del self.changes[:oldest - self.changes_base]
+        self.changes_base = oldest
+        return changes
 
     def in_bounds(self, id):
         (x, y) = id
@@ -18,6 +60,15 @@ class SquareGrid:
         else:
             return 1
 
+    def heuristic(self, a, b):
+        # Manhattan distance for 4-connected grids; on 8-connected grids a
+        # diagonal move also costs 1, so Chebyshev distance is the tight bound
+        (x1, y1) = a
+        (x2, y2) = b
+        if self.eightway:
+            return max(abs(x1 - x2), abs(y1 - y2))
+        return abs(x1 - x2) + abs(y1 - y2)
+
     def neighbors(self, id):
         (x, y) = id
         if self.eightway:
@@ -36,6 +87,49 @@ class SquareGrid:
                  if self.in_bounds((x, y))]
         return {node: WALL if node in self.walls else PASSABLE for node in nodes}
 
+class WindowSensor:
+    """
+    Incremental SquareGrid.observe for a single robot. After the first call,
+    observe() only reports cells that entered the window since the previous
+    call plus cells inside both windows whose wall state changed through
+    add_walls/remove_walls, so a one-cell move costs O(obs_range) rather than
+    O(obs_range ** 2).
+    """
+    def __init__(self, grid, obs_range = 2):
+        self.grid = grid
+        self.obs_range = obs_range
+        self.position = None
+        grid.watch_changes(self)
+
+    def observe(self, position):
+        grid = self.grid
+        r = self.obs_range
+        changes = grid.read_changes(self)
+        if self.position is None:
+            observation = grid.observe(position, r)
+        else:
+            observation = {}
+            (px, py) = self.position
+            (nx, ny) = position
+            for node, is_wall in changes:
+                (x, y) = node
+                if (abs(x - px) <= r and abs(y - py) <= r and
+                    abs(x - nx) <= r and abs(y - ny) <= r):
+                    observation[node] = WALL if node in grid.walls else PASSABLE
+
+            # Rows of the new window that were outside the old one
+            new_rows = (list(range(ny - r, min(ny + r, py - r - 1) + 1)) +
+                        list(range(max(ny - r, py + r + 1), ny + r + 1)))
+            all_rows = range(ny - r, ny + r + 1)
+            for x in range(nx - r, nx + r + 1):
+                for y in (new_rows if abs(x - px) <= r else all_rows):
+                    node = (x, y)
+                    if grid.in_bounds(node):
+                        observation[node] = WALL if node in grid.walls else PASSABLE
+
+        self.position = position
+        return observation
+
 class AgentViewGrid(SquareGrid):
 
     def new_walls(self, observation):
@@ -43,5 +137,11 @@ class AgentViewGrid(SquareGrid):
                         if nodetype == WALL}
         return walls_in_obs - self.walls
 
-    def update_walls(self, new_walls):
-        self.walls.update(new_walls)
\ No newline at end of file
+    def freed_walls(self, observation):
+        return {node for node, nodetype in observation.items()
+                if nodetype == PASSABLE and node in self.walls}
+
+    def update_walls(self, new_walls, freed_walls = ()):
+        self.walls.update(new_walls)
+        for node in freed_walls:
+            self.walls.discard(node)
@@ -0,0 +1,286 @@
+"""
+Multi-robot D* Lite with learned jam resolution. Robots follow their own
+D* Lite plans and wait when the next cell is taken by another robot. When
+robots have waited on each other for a while inside a window the size of the
+jams in a policy store (built by dstar_RL/policy_store.py), that window is
+handed to the stored policies until each robot reaches the window's border
+ring, after which it carries on with D* Lite. Robots that reach their goals
+park there and become walls on the shared map.
+
+The planner takes any store with PolicyStore's interface; the command line
+loads a PolicyStore, so dstar_RL must be on the import path:
+
+    PYTHONPATH=../dstar_RL python hierarchical.py ../dstar_RL/policies_2x2 --robots 8 --runs 50
+    python hierarchical.py ../dstar_RL/policies_2x2 --robots 8 --runs 50 --no-jams
+"""
+import argparse
+import csv
+import random
+import sys
+import time
+from collections import namedtuple
+
+from simulation import BACKENDS, generate_scenario
+
+TeamMetrics = namedtuple('TeamMetrics', ['seed', 'width', 'height', 'num_robots', 'reached',
+                                         'ticks', 'moves', 'waits', 'jams', 'jams_cleared',
+                                         'wall_time', 'error'])
+
+# GridWorld action letters as (dx, dy) moves on the D* Lite grid
+ACTION_STEPS = {'n': (0, -1), 's': (0, 1), 'e': (1, 0), 'w': (-1, 0)}
+
+class Jam(object):
+    """
+    Robots being driven by a stored jam policy. The window's GridWorld cell
+    (gx, gy) is grid cell (origin[0] - border_dist + gx, origin[1] - border_dist + gy).
+    """
+    def __init__(self, origin, border_dist, policy, members, deadline):
+        self.offset = (origin[0] - border_dist, origin[1] - border_dist)
+        self.policy = policy
+        # robot -> its start cell in GridWorld coordinates
+        self.members = members
+        self.deadline = deadline
+
+    def to_world(self, cell):
+        return (cell[0] - self.offset[0], cell[1] - self.offset[1])
+
+    def intended(self, robot, position):
+        # Next grid cell for a member, or None once it is on the border ring
+        action = self.policy.action(self.members[robot], self.to_world(position))
+        if action is None:
+            return None
+        (dx, dy) = ACTION_STEPS[action]
+        return (position[0] + dx, position[1] + dy)
+
+class HierarchicalPlanner(object):
+    """
+    Runs one D* Lite planner per robot on a shared map. With a PolicyStore,
+    robots that deadlock inside a jam-sized window are resolved by table
+    lookup; without one (store = None), they just keep waiting.
+    """
+    def __init__(self, graph, starts, goals, store = None, view_range = 2, backend = 'dict',
+                 patience = 2):
+        planner_class = BACKENDS[backend][1]
+        self.graph = graph
+        self.planners = [planner_class(graph, start, goal, view_range)
+                         for start, goal in zip(starts, goals)]
+        self.store = store
+        self.patience = patience
+        if store:
+            self.border_dist = store.border_dist
+            self.window = (store.width - 2 * store.border_dist,
+                           store.height - 2 * store.border_dist)
+        self.waiting = [0] * len(self.planners)
+        self.jam_of = {}
+        self.tick = 0
+        self.moves = self.waits = self.jams = self.jams_cleared = 0
+        for dstar in self.planners:
+            dstar.initial_plan()
+
+    def positions(self):
+        return [dstar.position for dstar in self.planners]
+
+    def done(self):
+        return all(dstar.position == dstar.goal for dstar in self.planners)
+
+    def step(self):
+        """
+        Advance every robot by at most one cell. A robot moves only if its
+        next cell is not a wall and is free, or is being vacated this tick.
+        """
+        self.tick += 1
+        for jam in set(self.jam_of.values()):
+            if self.tick > jam.deadline:
+                self.release(jam)
+
+        intended = {}
+        for r, dstar in enumerate(self.planners):
+            if dstar.position == dstar.goal:
+                continue
+            if r in self.jam_of:
+                node = self.jam_of[r].intended(r, dstar.position)
+            else:
+                node = dstar.next_position()
+                if node is None and dstar.g(dstar.position) == float('inf'):
+                    # Usually walled in by robots that are only passing or
+                    # parked nearby: wait, and look again next tick (the
+                    # tick limit ends runs that are really stuck)
+                    self.waiting[r] += 1
+                    self.waits += 1
+                    dstar.move_to(dstar.position)
+                    continue
+            if node is not None:
+                intended[r] = node
+
+        # Let robots move into cells that are free or freed this tick, until
+        # no more can; what is left (including swaps and cycles) waits
+        occupied = {dstar.position: r for r, dstar in enumerate(self.planners)}
+        moving = {}
+        progress = True
+        while progress:
+            progress = False
+            for r, node in intended.items():
+                if (r in moving or not self.graph.in_bounds(node) or
+                        node in self.graph.walls or node in moving.values()):
+                    continue
+                holder = occupied.get(node)
+                if holder is None or holder in moving:
+                    moving[r] = node
+                    progress = True
+
+        for r, dstar in enumerate(self.planners):
+            if r in moving:
+                dstar.move_to(moving[r])
+                self.waiting[r] = 0
+                self.moves += 1
+                jam = self.jam_of.get(r)
+                if jam and (dstar.position == dstar.goal or
+                            jam.intended(r, dstar.position) is None):
+                    self.leave(jam, r)
+                if dstar.position == dstar.goal:
+                    # A parked robot is an obstacle the others sense and plan around
+                    self.graph.add_walls([dstar.goal])
+            elif r in intended:
+                self.waiting[r] += 1
+                self.waits += 1
+                # The policy assumed a clear border, so a member stuck behind
+                # a wall or robot it cannot see past goes back to D* Lite
+                jam = self.jam_of.get(r)
+                if jam and (intended[r] in self.graph.walls or
+                            not self.graph.in_bounds(intended[r]) or
+                            self.waiting[r] >= self.patience):
+                    self.leave(jam, r)
+                elif not jam and intended[r] in self.graph.walls:
+                    # A robot parked in the way; look again and replan
+                    dstar.move_to(dstar.position)
+
+        if self.store:
+            for r in range(len(self.planners)):
+                if r not in self.jam_of and self.waiting[r] >= self.patience:
+                    self.start_jam(r)
+        return self.positions()
+
+    def leave(self, jam, r):
+        del self.jam_of[r]
+        del jam.members[r]
+        if not jam.members:
+            self.jams_cleared += 1
+
+    def release(self, jam):
+        # Give up on a jam that overran its deadline
+        for r in list(jam.members):
+            del self.jam_of[r]
+        jam.members.clear()
+
+    def start_jam(self, r):
+        """
+        Find a window containing robot r that matches a stored jam, preferring
+        the one that takes in the most waiting robots, and hand its robots
+        over to the stored policies
+        """
+        (w, h) = self.window
+        b = self.border_dist
+        (x, y) = self.planners[r].position
+        occupied = {dstar.position: i for i, dstar in enumerate(self.planners)
+                    if dstar.position != dstar.goal}
+        best = None
+        for ox in range(x - w + 1, x + 1):
+            for oy in range(y - h + 1, y + 1):
+                if not (ox >= 0 and oy >= 0 and
+                        ox + w <= self.graph.width and oy + h <= self.graph.height):
+                    continue
+                members = {occupied[(ox + i, oy + j)]
+                           for i in range(w) for j in range(h) if (ox + i, oy + j) in occupied}
+                if any(m in self.jam_of for m in members):
+                    continue
+                # Configuration lines run along x, entries along y (see get_start_states)
+                config = ",_,".join(
+                    ",".join('r' if (ox + i, oy + j) in occupied else
+                             'X' if (ox + i, oy + j) in self.graph.walls else 'o'
+                             for j in range(h))
+                    for i in range(w))
+                if config not in self.store:
+                    continue
+                score = sum(1 for m in members if self.waiting[m] > 0)
+                if best is None or score > best[0]:
+                    best = (score, (ox, oy), config, members)
+        if best is None:
+            return None
+
+        (score, origin, config, members) = best
+        policy = self.store.lookup(config)
+        starts = {m: (self.planners[m].position[0] - origin[0] + b,
+                      self.planners[m].position[1] - origin[1] + b) for m in members}
+        jam = Jam(origin, b, policy, starts,
+                  self.tick + 2 * (self.store.width + self.store.height))
+        for m in members:
+            self.jam_of[m] = jam
+            self.waiting[m] = 0
+        self.jams += 1
+        return jam
+
+def run_team(scenario, store = None, view_range = 2, eightway = False, backend = 'dict',
+             max_ticks = None, seed = None, patience = 2):
+    """
+    Run a scenario with every robot on one shared map until all reach their
+    goals or max_ticks pass. Returns a TeamMetrics record.
+    """
+    if max_ticks is None:
+        max_ticks = scenario.width * scenario.height
+    began = time.perf_counter()
+    graph = BACKENDS[backend][0](scenario.width, scenario.height, eightway)
+    graph.walls.update(scenario.obstacles)
+    error = None
+    team = None
+    try:
+        team = HierarchicalPlanner(graph, scenario.starts, scenario.goals, store, view_range,
+                                   backend, patience)
+        while not team.done():
+            if team.tick >= max_ticks:
+                error = "Step limit reached"
+                break
+            team.step()
+    except Exception as e:
+        error = str(e)
+
+    if team is None:
+        return TeamMetrics(seed, scenario.width, scenario.height, len(scenario.starts), 0,
+                           0, 0, 0, 0, 0, time.perf_counter() - began, error)
+    reached = sum(1 for p in team.planners if p.position == p.goal)
+    return TeamMetrics(seed, scenario.width, scenario.height, len(team.planners), reached,
+                       team.tick, team.moves, team.waits, team.jams, team.jams_cleared,
+                       time.perf_counter() - began, error)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Multi-robot D* Lite with stored jam policies")
+    parser.add_argument('store', help = "policy store directory (see dstar_RL/policy_store.py)")
+    parser.add_argument('--width', type = int, default = 15)
+    parser.add_argument('--height', type = int, default = 15)
+    parser.add_argument('--robots', type = int, default = 6)
+    parser.add_argument('--density', type = float, default = None)
+    parser.add_argument('--view-range', type = int, default = 2)
+    parser.add_argument('--runs', type = int, default = 10)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--backend', choices = sorted(BACKENDS), default = 'dict')
+    parser.add_argument('--eightway', action = 'store_true',
+                        help = "8-connected planning (jam policies only move 4 ways)")
+    parser.add_argument('--patience', type = int, default = 2,
+                        help = "ticks a robot waits before a jam is looked up")
+    parser.add_argument('--no-jams', action = 'store_true',
+                        help = "baseline: never hand robots to the jam policies")
+    args = parser.parse_args()
+
+    store = None
+    if not args.no_jams:
+        try:
+            from policy_store import PolicyStore
+        except ImportError:
+            parser.error("policy_store not found; add dstar_RL to PYTHONPATH")
+        store = PolicyStore(args.store)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(TeamMetrics._fields)
+    for seed in range(args.seed, args.seed + args.runs):
+        scenario = generate_scenario(args.width, args.height, args.robots, random.Random(seed),
+                                     args.density)
+        writer.writerow(run_team(scenario, store, args.view_range, args.eightway, args.backend,
+                                 seed = seed, patience = args.patience))
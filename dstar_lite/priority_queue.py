@@ -23,4 +23,69 @@ class PriorityQueue:
 
     def __iter__(self):
         for key, node in self.elements:
-            yield node
\ No newline at end of file
+            yield node
+
+# Entry layout used by IndexedPriorityQueue: [priority, node, alive]
+PRIORITY, NODE, ALIVE = 0, 1, 2
+
+class IndexedPriorityQueue:
+    """
+    Heap with a node -> entry index. Removing or re-prioritising a node marks
+    its old entry dead instead of rebuilding the heap, so put/delete/pop are
+    O(log n) and first_key is an (amortised) O(1) peek at the heap top.
+    """
+    # Rebuild the heap once dead entries outnumber live ones by this factor
+    COMPACT_RATIO = 2
+
+    def __init__(self):
+        self.elements = []
+        self.entries = {}
+
+    def empty(self):
+        return not self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, node):
+        return node in self.entries
+
+    def put(self, item, priority):
+        old = self.entries.get(item)
+        if old is not None:
+            old[ALIVE] = False
+        entry = [priority, item, True]
+        self.entries[item] = entry
+        heapq.heappush(self.elements, entry)
+        self._maybe_compact()
+
+    def pop(self):
+        self._drop_dead()
+        entry = heapq.heappop(self.elements)
+        del self.entries[entry[NODE]]
+        return entry[NODE]
+
+    def first_key(self):
+        self._drop_dead()
+        if not self.elements:
+            return (float('inf'), float('inf'))
+        return self.elements[0][PRIORITY]
+
+    def delete(self, node):
+        entry = self.entries.pop(node, None)
+        if entry is not None:
+            entry[ALIVE] = False
+            self._maybe_compact()
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def _drop_dead(self):
+        elements = self.elements
+        while elements and not elements[0][ALIVE]:
+            heapq.heappop(elements)
+
+    def _maybe_compact(self):
+        if len(self.elements) > self.COMPACT_RATIO * len(self.entries) + 64:
+            self.elements = [e for e in self.elements if e[ALIVE]]
+            heapq.heapify(self.elements)
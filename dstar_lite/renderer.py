@@ -0,0 +1,198 @@
+"""
+Incremental pygame renderer for the D* Lite visualizer. Walls are drawn once
+onto a background surface (and patched as the wall change log grows), step
+numbers are rendered once per (text, colour) and reused, and each frame only
+repaints the cells whose contents changed, handing those rectangles to
+pygame.display.update.
+"""
+import pygame
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GRAY = (77, 77, 51)
+BLUE = (0, 0, 80)
+GOLD = (255, 215, 0)
+
+# Robot i uses ROBOT_COLORS[i % len(ROBOT_COLORS)]
+ROBOT_COLORS = [(0, 255, 0), (255, 0, 0), (255, 192, 203), (0, 0, 80), (255, 128, 0),
+                (128, 0, 128), (0, 160, 160), (139, 69, 19), (0, 100, 0), (70, 70, 255),
+                (200, 0, 100), (100, 100, 100)]
+# Where in its cell robot i's step numbers go, in quarters of the cell
+TEXT_SLOTS = [(1, 1), (3, 1), (1, 3), (3, 3)]
+
+# Cells smaller than this get no step numbers
+MIN_TEXT_CELL = 12
+
+class GridRenderer(object):
+    def __init__(self, screen, graph, cell_size, margin = 1, view_range = 2,
+                 colors = ROBOT_COLORS):
+        self.screen = screen
+        self.graph = graph
+        self.cell_size = cell_size
+        self.margin = margin
+        self.view_range = view_range
+        self.colors = colors
+        self.show_numbers = cell_size >= MIN_TEXT_CELL
+        self.path_font = pygame.font.SysFont('Comic Sans MS', 12)
+        self.goal_font = pygame.font.SysFont('Comic Sans MS', 16)
+        self.glyphs = {}
+
+        self.background = pygame.Surface(screen.get_size())
+        self.background.fill(BLACK)
+        for y in range(graph.height):
+            for x in range(graph.width):
+                self.paint_background((x, y), (x, y) in graph.walls)
+        # The wall set drawn so far, until draw() starts following the
+        # graph's change log (snapshots carry their own wall sets)
+        self.walls = frozenset(graph.walls)
+
+        # What was drawn on each cell last frame, and the last view outlines
+        self.cells = {}
+        self.outlines = []
+        self.first_frame = True
+
+    def cell_rect(self, node):
+        pitch = self.cell_size + self.margin
+        return pygame.Rect(pitch * node[0] + self.margin, pitch * node[1] + self.margin,
+                           self.cell_size, self.cell_size)
+
+    def paint_background(self, node, is_wall):
+        self.background.fill(GRAY if is_wall else WHITE, self.cell_rect(node))
+
+    def glyph(self, font, text, colour):
+        key = (id(font), text, colour)
+        if key not in self.glyphs:
+            self.glyphs[key] = font.render(text, True, colour)
+        return self.glyphs[key]
+
+    def outline_rect(self, position):
+        pitch = self.cell_size + self.margin
+        centre = self.cell_rect(position).center
+        return pygame.Rect(centre[0] - self.view_range * pitch, centre[1] - self.view_range * pitch,
+                           2 * self.view_range * pitch, 2 * self.view_range * pitch)
+
+    def frame_contents(self, positions, goals, paths):
+        """
+        Map each cell to the items drawn on it, in drawing order: step
+        numbers, then goals, then robots
+        """
+        cells = {}
+        if self.show_numbers:
+            for i, path in enumerate(paths):
+                path = path[::-1]
+                for j in range(1, len(path)):
+                    cells.setdefault(path[j], []).append((0, i, j))
+        for i, goal in enumerate(goals):
+            cells.setdefault(goal, []).append((1, i, 0))
+        for i, position in enumerate(positions):
+            cells.setdefault(position, []).append((2, i, 0))
+        return {node: tuple(items) for node, items in cells.items()}
+
+    def text_item(self, node, item):
+        # The glyph for a step number or goal item and where it goes
+        (layer, i, j) = item
+        colour = self.colors[i % len(self.colors)]
+        if layer == 1:
+            text = self.glyph(self.goal_font, "G", colour)
+            return text, text.get_rect(center = self.cell_rect(node).center)
+        pitch = self.cell_size + self.margin
+        text = self.glyph(self.path_font, str(j), colour)
+        slot = TEXT_SLOTS[i % len(TEXT_SLOTS)]
+        return text, text.get_rect(
+            centerx = int(node[0] * pitch + self.cell_size / 4 * slot[0]) + self.margin,
+            centery = int(node[1] * pitch + self.cell_size / 4 * slot[1]) + self.margin)
+
+    def extent(self, node, items):
+        # Everything drawn for a cell's items, including text that spills
+        # over its edges
+        rect = self.cell_rect(node)
+        return rect.unionall([self.text_item(node, item)[1] for item in items if item[0] < 2])
+
+    def draw_items(self, node, items, layer):
+        for item in items:
+            if item[0] != layer:
+                continue
+            if layer == 2:
+                self.screen.fill(self.colors[item[1] % len(self.colors)], self.cell_rect(node))
+                continue
+            if layer == 1:
+                self.screen.fill(GOLD, self.cell_rect(node))
+            self.screen.blit(*self.text_item(node, item))
+
+    def draw(self, planners):
+        """
+        Bring the screen up to date with live planners and return the
+        rectangles that changed (the whole screen on the first call)
+        """
+        if self not in self.graph.change_readers:
+            # First live frame: catch up on the walls changed since __init__,
+            # then read the change log
+            walls = [(node, True) for node in self.graph.walls - self.walls]
+            walls += [(node, False) for node in self.walls - self.graph.walls]
+            self.graph.watch_changes(self)
+        else:
+            walls = self.graph.read_changes(self)
+        return self.draw_frame([dstar.position for dstar in planners],
+                               [dstar.goal for dstar in planners],
+                               [dstar.current_path() for dstar in planners], walls)
+
+    def draw_snapshot(self, snapshot):
+        """
+        Like draw, from a sim_thread.Snapshot instead of the planners, so the
+        render thread never reads state the simulation thread is changing
+        """
+        walls = []
+        if snapshot.walls is not self.walls:
+            walls = [(node, True) for node in snapshot.walls - self.walls]
+            walls += [(node, False) for node in self.walls - snapshot.walls]
+            self.walls = snapshot.walls
+        return self.draw_frame(snapshot.positions, snapshot.goals, snapshot.paths, walls)
+
+    def draw_frame(self, positions, goals, paths, walls):
+        # walls lists (node, is_wall) changes since the last frame
+        rects = []
+        for node, is_wall in walls:
+            self.paint_background(node, is_wall)
+            rects.append(self.cell_rect(node))
+
+        cells = self.frame_contents(positions, goals, paths)
+        for node in set(cells) | set(self.cells):
+            old, new = self.cells.get(node, ()), cells.get(node, ())
+            if old != new:
+                rects.append(self.extent(node, old).union(self.extent(node, new)))
+        outlines = [self.outline_rect(position) for position in positions]
+
+        if self.first_frame:
+            self.first_frame = False
+            rects = [self.screen.get_rect()]
+        else:
+            # A moved view outline uncovers its old border and draws a new one
+            for old, new in zip(self.outlines, outlines):
+                if old != new:
+                    rects += [old.inflate(2, 2), new.inflate(2, 2)]
+        self.cells = cells
+        self.outlines = outlines
+        if not rects:
+            return []
+
+        for rect in rects:
+            self.screen.set_clip(rect)
+            self.screen.blit(self.background, rect, rect)
+            # Redraw everything that overlaps this rectangle, layer by layer
+            # like a full redraw; text spills at most one cell, so look one
+            # cell around it
+            pitch = self.cell_size + self.margin
+            nearby = [((x, y), cells[(x, y)])
+                      for x in range(max(0, rect.left // pitch - 1),
+                                     min(self.graph.width, rect.right // pitch + 2))
+                      for y in range(max(0, rect.top // pitch - 1),
+                                     min(self.graph.height, rect.bottom // pitch + 2))
+                      if (x, y) in cells]
+            for layer in range(3):
+                for node, items in nearby:
+                    self.draw_items(node, items, layer)
+            for outline in outlines:
+                if outline.colliderect(rect):
+                    pygame.draw.rect(self.screen, BLUE, outline, 2)
+        self.screen.set_clip(None)
+        return rects
@@ -0,0 +1,173 @@
+"""
+Binary scenario files. A file holds any number of scenarios with the same map
+size and robot count as fixed-size records, so scenario i is read straight
+out of a memory map and every worker process can share the same pages:
+
+    header   '<4sHHIIII': magic, version, reserved, width, height, robots, count
+    record   starts then goals as little-endian uint32 (x, y) pairs, followed
+             by the obstacle bitmap, one bit per cell in y * width + x order,
+             most significant bit first, zero-padded to a whole byte
+
+    python scenario_io.py scenarios.bin --width 512 --height 512 --robots 8 --count 1000
+"""
+import argparse
+import mmap
+import random
+import struct
+
+from array_grid import ArrayGrid, WallBitmap
+from simulation import Scenario, generate_scenario
+
+MAGIC = b'DSLS'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIII')
+
+# BIT_TABLES[k] maps a packed byte to its bit k (most significant first) and
+# SHIFT_TABLES[k] maps a cell byte to that bit's value, so packing and
+# unpacking are 8 bytes.translate passes over strided slices
+BIT_TABLES = [bytes((b >> (7 - k)) & 1 for b in range(256)) for k in range(8)]
+SHIFT_TABLES = [bytes((1 << (7 - k)) if b else 0 for b in range(256)) for k in range(8)]
+
+def pack_bits(cells):
+    """
+    Pack a one-byte-per-cell buffer (nonzero = wall) into bits, without a
+    Python-level loop over cells
+    """
+    cells = bytes(cells) + bytes(-len(cells) % 8)
+    packed = 0
+    for k in range(8):
+        packed |= int.from_bytes(cells[k::8].translate(SHIFT_TABLES[k]), 'big')
+    return packed.to_bytes(len(cells) // 8, 'big')
+
+def unpack_bits(packed, size):
+    """
+    Inverse of pack_bits: a bytearray of size 0/1 cells
+    """
+    packed = bytes(packed)
+    cells = bytearray(len(packed) * 8)
+    for k in range(8):
+        cells[k::8] = packed.translate(BIT_TABLES[k])
+    del cells[size:]
+    return cells
+
+def record_size(width, height, num_robots):
+    return 16 * num_robots + (width * height + 7) // 8
+
+def write_scenarios(path, scenarios):
+    """
+    Write scenarios (all the same size and robot count) to a scenario file
+    """
+    scenarios = list(scenarios)
+    if not scenarios:
+        raise ValueError("No scenarios to write")
+    width, height = scenarios[0].width, scenarios[0].height
+    num_robots = len(scenarios[0].starts)
+    points = struct.Struct('<{}I'.format(4 * num_robots))
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, width, height, num_robots, len(scenarios)))
+        for scenario in scenarios:
+            if ((scenario.width, scenario.height) != (width, height) or
+                    len(scenario.starts) != num_robots):
+                raise ValueError("All scenarios in a file must have the same size and robot count")
+            if isinstance(scenario.obstacles, WallBitmap):
+                cells = scenario.obstacles.cells
+            else:
+                cells = bytearray(width * height)
+                for (x, y) in scenario.obstacles:
+                    cells[y * width + x] = 1
+            f.write(points.pack(*[c for node in scenario.starts + scenario.goals for c in node]))
+            f.write(pack_bits(cells))
+
+class ScenarioFile(object):
+    """
+    Read-only, memory-mapped view of a scenario file. Obstacles come back as
+    WallBitmaps, which ArrayGrid walls take over with a single buffer copy.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        (magic, version, reserved, self.width, self.height, self.num_robots,
+         self.count) = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a version {} scenario file".format(path, VERSION))
+        self.points = struct.Struct('<{}I'.format(4 * self.num_robots))
+        self.record_size = record_size(self.width, self.height, self.num_robots)
+        if len(self.map) != HEADER.size + self.count * self.record_size:
+            raise ValueError("{} is truncated".format(path))
+
+    def __len__(self):
+        return self.count
+
+    def offset(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return HEADER.size + i * self.record_size
+
+    def endpoints(self, i):
+        """
+        Return the (starts, goals) lists of scenario i
+        """
+        values = self.points.unpack_from(self.map, self.offset(i))
+        nodes = list(zip(values[0::2], values[1::2]))
+        return nodes[:self.num_robots], nodes[self.num_robots:]
+
+    def walls(self, i):
+        start = self.offset(i) + self.points.size
+        packed = self.map[start:start + self.record_size - self.points.size]
+        walls = WallBitmap(self.width, self.height)
+        walls.cells[:] = unpack_bits(packed, self.width * self.height)
+        bits = int.from_bytes(packed, 'big')
+        # int.bit_count is Python 3.10+
+        walls.count = bits.bit_count() if hasattr(bits, 'bit_count') else walls.cells.count(1)
+        return walls
+
+    def __getitem__(self, i):
+        starts, goals = self.endpoints(i)
+        return Scenario(self.width, self.height, starts, goals, self.walls(i))
+
+    def grid(self, i, grid_class = ArrayGrid, eightway = True):
+        """
+        Build a grid of scenario i's map. ArrayGrids copy the bitmap; a
+        SquareGrid's wall set is filled from the bitmap's wall positions.
+        """
+        graph = grid_class(self.width, self.height, eightway)
+        graph.walls.update(self.walls(i))
+        return graph
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ScenarioFiles opened by load_scenario, one per path in each process
+_open_files = {}
+
+def load_scenario(path, i):
+    """
+    Scenario i of the file at path, keeping the file mapped for later calls
+    (so pool workers can be handed just a path and an index)
+    """
+    if path not in _open_files:
+        _open_files[path] = ScenarioFile(path)
+    return _open_files[path][i]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Write generated scenarios to a scenario file")
+    parser.add_argument('path')
+    parser.add_argument('--width', type = int, default = 15)
+    parser.add_argument('--height', type = int, default = 15)
+    parser.add_argument('--robots', type = int, default = 2)
+    parser.add_argument('--density', type = float, default = None)
+    parser.add_argument('--count', type = int, default = 100)
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+
+    write_scenarios(args.path, (generate_scenario(args.width, args.height, args.robots,
+                                                  random.Random(seed), args.density)
+                                for seed in range(args.seed, args.seed + args.count)))
+    print("Wrote {} scenarios to {}".format(args.count, args.path))
@@ -0,0 +1,118 @@
+"""
+Runs the visualizer's robots on a worker thread so that replanning never
+blocks the pygame event loop. The thread owns the planners and their maps;
+the UI only talks to it through a command queue and only reads the immutable
+Snapshot it publishes after each step.
+"""
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# What the render thread may look at: per-robot positions, goals and current
+# paths (as returned by DStarLite.current_path), which robots are done, and
+# the wall set. walls is the same frozenset object until the walls change.
+Snapshot = namedtuple('Snapshot', ['step', 'positions', 'goals', 'paths', 'reached',
+                                   'walls', 'error'])
+
+# Commands for SimulationThread.commands
+STEP = 'step'
+TOGGLE_WALL = 'toggle'
+STOP = 'stop'
+
+class SimulationThread(threading.Thread):
+    """
+    Steps a team of robots (a coordinator.Coordinator) on request, or every
+    `delay` seconds with automate = True. Wall toggles are queued and applied
+    to the team's map as one batch between steps.
+    """
+    def __init__(self, team, automate = False, delay = 0.45):
+        super().__init__(daemon = True)
+        self.team = team
+        self.planners = team.planners
+        self.automate = automate
+        self.delay = delay
+        self.commands = queue.Queue()
+        self.steps = 0
+        self.walls = frozenset(team.graph.walls)
+        self.snapshot = None
+        self.publish(None)
+
+    def step(self):
+        self.commands.put((STEP, None))
+
+    def toggle_wall(self, node):
+        self.commands.put((TOGGLE_WALL, node))
+
+    def stop(self):
+        self.commands.put((STOP, None))
+
+    def publish(self, error):
+        # A fresh tuple each time, swapped in with one assignment
+        self.snapshot = Snapshot(self.steps,
+                                 tuple(dstar.position for dstar in self.planners),
+                                 tuple(dstar.goal for dstar in self.planners),
+                                 tuple(tuple(dstar.current_path()) for dstar in self.planners),
+                                 tuple(dstar.position == dstar.goal for dstar in self.planners),
+                                 self.walls, error)
+
+    def apply_walls(self, toggles):
+        goals = {dstar.goal for dstar in self.planners}
+        walls = set(self.walls)
+        for node in toggles:
+            # Goal cells cannot be walled off
+            if node in goals:
+                continue
+            if node in walls:
+                walls.discard(node)
+            else:
+                walls.add(node)
+        # Only the net change reaches the maps (a double click is a no-op)
+        added = [node for node in set(toggles) if node in walls and node not in self.walls]
+        removed = [node for node in set(toggles) if node in self.walls and node not in walls]
+        if not added and not removed:
+            return
+        self.team.graph.remove_walls(removed)
+        self.team.graph.add_walls(added)
+        self.walls = frozenset(walls)
+
+    def move_bots(self):
+        reached = [dstar.position == dstar.goal for dstar in self.planners]
+        self.team.step()
+        for i, dstar in enumerate(self.planners):
+            if dstar.position == dstar.goal and not reached[i]:
+                print("Goal {} Reached!".format(i + 1))
+        self.steps += 1
+
+    def run(self):
+        next_step = time.monotonic() + self.delay
+        while True:
+            # Block for the next command; in automate mode, only until the
+            # next step is due
+            timeout = max(0, next_step - time.monotonic()) if self.automate else None
+            try:
+                commands = [self.commands.get(timeout = timeout)]
+            except queue.Empty:
+                commands = []
+            while True:
+                try:
+                    commands.append(self.commands.get_nowait())
+                except queue.Empty:
+                    break
+
+            if any(kind == STOP for kind, node in commands):
+                return
+            self.apply_walls([node for kind, node in commands if kind == TOGGLE_WALL])
+            steps = sum(1 for kind, node in commands if kind == STEP)
+            if self.automate and time.monotonic() >= next_step:
+                steps += 1
+                next_step = time.monotonic() + self.delay
+            try:
+                for _ in range(steps):
+                    self.move_bots()
+            except Exception as e:
+                self.publish(str(e))
+                return
+            self.publish(None)
+            if all(self.snapshot.reached):
+                return
@@ -0,0 +1,203 @@
+"""
+Headless D* Lite simulation: the same scenarios as main.py, run to completion
+without pygame, reporting per-run metrics.
+
+    python simulation.py --width 50 --height 50 --robots 4 --runs 100
+    python simulation.py --width 50 --height 50 --robots 12 --runs 100 --shared
+    python simulation.py --width 50 --height 50 --robots 12 --goals 2 --share-goals
+"""
+import argparse
+import csv
+import random
+import sys
+import time
+from collections import namedtuple
+
+from grid import SquareGrid
+from array_grid import ArrayGrid
+from dstarlite import DStarLite, CompactDStarLite
+from coordinator import Coordinator
+
+Scenario = namedtuple('Scenario', ['width', 'height', 'starts', 'goals', 'obstacles'])
+
+RunMetrics = namedtuple('RunMetrics', ['seed', 'width', 'height', 'num_robots',
+                                       'num_obstacles', 'reached', 'steps', 'path_cost',
+                                       'replans', 'expanded', 'wall_time', 'error'])
+
+# Grid and planner classes for each storage backend
+BACKENDS = {
+    'dict': (SquareGrid, DStarLite),
+    'array': (ArrayGrid, CompactDStarLite),
+}
+
+def generate_scenario(x_dim, y_dim, num_robots, rng = random, obstacle_density = None,
+                      num_goals = None):
+    """
+    Pick non-overlapping start/goal pairs for each robot and scatter random
+    obstacles that avoid them. Without an explicit density, 5-10% of the map
+    is covered, as in main.py. With num_goals, robots instead share that many
+    goal cells (like docks in a warehouse), assigned in turn.
+    """
+    starts, goals = [], []
+    if num_goals is not None:
+        docks = []
+        while len(docks) < num_goals:
+            dock = (rng.randint(0, x_dim - 1), rng.randint(0, y_dim - 1))
+            if dock not in docks:
+                docks.append(dock)
+        while len(starts) < num_robots:
+            start = (rng.randint(0, x_dim - 1), rng.randint(0, y_dim - 1))
+            if start not in docks and start not in starts:
+                starts.append(start)
+        goals = [docks[i % num_goals] for i in range(num_robots)]
+    for i in range(len(starts), num_robots):
+        while(True):
+            start = (rng.randint(0, x_dim - 1), rng.randint(0, y_dim - 1))
+            goal = (rng.randint(0, x_dim - 1), rng.randint(0, y_dim - 1))
+            while(goal == start):
+                goal = (rng.randint(0, x_dim - 1), rng.randint(0, y_dim - 1))
+            taken = set(starts) | set(goals)
+            if start not in taken and goal not in taken:
+                starts.append(start)
+                goals.append(goal)
+                break
+
+    if obstacle_density is None:
+        obstacle_density = rng.randint(5, 10) / 100
+    reserved = set(starts) | set(goals)
+    obstacles = []
+    for i in range(int((x_dim * y_dim) * obstacle_density)):
+        obstacle_coords = (rng.randint(0, x_dim - 1), rng.randint(0, y_dim - 1))
+        if obstacle_coords not in reserved:
+            obstacles.append(obstacle_coords)
+    return Scenario(x_dim, y_dim, starts, goals, obstacles)
+
+def build_planners(scenario, view_range = 2, eightway = True, backend = 'dict',
+                   incremental = False):
+    """
+    Create one D* Lite planner per robot, each with its own copy of the map,
+    the same way main.py does.
+    """
+    grid_class, planner_class = BACKENDS[backend]
+    planners = []
+    for start, goal in zip(scenario.starts, scenario.goals):
+        g = grid_class(scenario.width, scenario.height, eightway)
+        g.walls.update(scenario.obstacles)
+        planners.append(planner_class(g, start, goal, view_range, incremental))
+    return planners
+
+def build_team(scenario, view_range = 2, eightway = True, backend = 'dict',
+               incremental = False, share_goals = False):
+    """
+    Create a Coordinator running one planner per robot (or per goal, with
+    share_goals) over a single map and a single known-walls map shared by
+    all robots.
+    """
+    grid_class, planner_class = BACKENDS[backend]
+    g = grid_class(scenario.width, scenario.height, eightway)
+    g.walls.update(scenario.obstacles)
+    return Coordinator(g, scenario.starts, scenario.goals, planner_class, view_range,
+                       incremental, share_goals)
+
+def run_ticks(planners, max_steps, team = None, on_step = None):
+    """
+    Advance every robot one move per tick until all of them reach their goals,
+    one of them fails, or max_steps ticks pass; with a team, the team moves
+    them. Calls on_step(planner, last_position, step) for each move made and
+    returns the error that stopped the run, or None if every robot arrived.
+    """
+    try:
+        for tick in range(max_steps):
+            active = [p for p in planners if p.position != p.goal]
+            if not active:
+                break
+            last_positions = [dstar.position for dstar in active]
+            if team:
+                results = team.step()
+            else:
+                results = (dstar.step() for dstar in active)
+            for dstar, last_position, step in zip(active, last_positions, results):
+                if on_step:
+                    on_step(dstar, last_position, step)
+    except Exception as e:
+        return str(e)
+    # Running out of ticks only counts against a run that left a robot short
+    if any(p.position != p.goal for p in planners):
+        return "Step limit reached"
+    return None
+
+def run_scenario(scenario, view_range = 2, eightway = True, backend = 'dict',
+                 max_steps = None, seed = None, incremental = False, shared = False,
+                 share_goals = False):
+    """
+    Run a scenario to completion with run_ticks. Returns a RunMetrics record.
+    With shared = True the robots run under a Coordinator and pool what they
+    sense instead of each keeping its own maps; share_goals (which implies
+    shared) also gives robots with the same goal one search between them.
+    """
+    if max_steps is None:
+        max_steps = scenario.width * scenario.height
+    began = time.perf_counter()
+    if shared or share_goals:
+        team = build_team(scenario, view_range, eightway, backend, incremental, share_goals)
+        planners = team.planners
+    else:
+        team = None
+        planners = build_planners(scenario, view_range, eightway, backend, incremental)
+    totals = dict.fromkeys(['steps', 'path_cost', 'replans', 'expanded'], 0)
+
+    def count(dstar, last_position, step):
+        totals['steps'] += 1
+        if step.position != last_position:
+            totals['path_cost'] += dstar.real_graph.cost(last_position, step.position)
+        totals['replans'] += step.replanned
+        totals['expanded'] += step.expanded
+
+    error = run_ticks(planners, max_steps, team, count)
+    reached = sum(1 for p in planners if p.position == p.goal)
+    return RunMetrics(seed, scenario.width, scenario.height, len(planners),
+                      len(scenario.obstacles), reached, totals['steps'], totals['path_cost'],
+                      totals['replans'], totals['expanded'], time.perf_counter() - began,
+                      error)
+
+def run_batch(num_runs, width, height, num_robots, view_range = 2,
+              obstacle_density = None, base_seed = 0, num_goals = None, **kwargs):
+    """
+    Yield RunMetrics for num_runs scenarios seeded base_seed, base_seed + 1, ...
+    """
+    for seed in range(base_seed, base_seed + num_runs):
+        rng = random.Random(seed)
+        scenario = generate_scenario(width, height, num_robots, rng, obstacle_density,
+                                     num_goals)
+        yield run_scenario(scenario, view_range, seed = seed, **kwargs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run D* Lite scenarios without a display")
+    parser.add_argument('--width', type = int, default = 15)
+    parser.add_argument('--height', type = int, default = 15)
+    parser.add_argument('--robots', type = int, default = 2)
+    parser.add_argument('--density', type = float, default = None,
+                        help = "obstacle density (default: random 5-10%%)")
+    parser.add_argument('--view-range', type = int, default = 2)
+    parser.add_argument('--runs', type = int, default = 10)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--backend', choices = sorted(BACKENDS), default = 'dict')
+    parser.add_argument('--fourway', action = 'store_true')
+    parser.add_argument('--incremental', action = 'store_true',
+                        help = "only sense cells that came into view")
+    parser.add_argument('--shared', action = 'store_true',
+                        help = "one shared map and pooled sensing for all robots")
+    parser.add_argument('--goals', type = int, default = None,
+                        help = "robots share this many goal cells (default: one each)")
+    parser.add_argument('--share-goals', action = 'store_true',
+                        help = "like --shared, plus one search per goal cell")
+    args = parser.parse_args()
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(RunMetrics._fields)
+    for metrics in run_batch(args.runs, args.width, args.height, args.robots,
+                             args.view_range, args.density, args.seed, args.goals,
+                             eightway = not args.fourway, backend = args.backend,
+                             incremental = args.incremental, shared = args.shared,
+                             share_goals = args.share_goals):
+        writer.writerow(metrics)
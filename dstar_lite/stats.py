@@ -0,0 +1,169 @@
+"""
+Opt-in instrumentation for D* Lite planners. PlannerStats.attach wraps a
+planner's methods (and its frontier's) on the instance, counting frontier
+operations and node updates and timing sensing and planning; detach removes
+the wrappers again. Planners that were never attached run the plain class
+code, so leaving stats off costs nothing.
+
+    python stats.py --width 50 --height 50 --robots 4 --runs 10
+    python stats.py --width 50 --height 50 --robots 4 --runs 1 --steps
+"""
+import argparse
+import csv
+import random
+import sys
+import time
+from collections import namedtuple
+
+from simulation import BACKENDS, build_planners, generate_scenario, run_ticks
+
+# Counters kept for each step and for the whole run
+COUNTERS = ['pops', 'pushes', 'deletes', 'updates', 'peak_frontier',
+            'sense_time', 'plan_time', 'step_time']
+
+StepStats = namedtuple('StepStats', ['step', 'position', 'replanned'] + COUNTERS)
+RunStats = namedtuple('RunStats', ['steps', 'replans'] + COUNTERS)
+
+class PlannerStats(object):
+    """
+    Counters and timers for one planner. Each step() call made while
+    attached adds a StepStats record to `steps` (and is passed to on_step,
+    if given); totals() sums them into a RunStats record.
+    """
+    def __init__(self, on_step = None):
+        self.on_step = on_step
+        self.steps = []
+        self.planner = None
+        self.reset()
+
+    def reset(self):
+        # Counters for the step in progress
+        self.current = dict.fromkeys(COUNTERS, 0)
+        self.current['peak_frontier'] = len(self.planner.frontier) if self.planner else 0
+
+    def attach(self, planner):
+        if self.planner is not None:
+            raise ValueError("PlannerStats is already attached")
+        self.planner = planner
+        frontier = planner.frontier
+        self.wrap(frontier, 'pop', self.count('pops'))
+        self.wrap(frontier, 'put', self.count_push)
+        self.wrap(frontier, 'delete', self.count('deletes'))
+        # CompactDStarLite funnels every node update through _update
+        self.wrap(planner, '_update' if hasattr(planner, '_update') else 'update_node',
+                  self.count('updates'))
+        self.wrap(planner, 'sense', self.timer('sense_time'))
+        self.wrap(planner, 'compute_shortest_path', self.timer('plan_time'))
+        self.wrap(planner, 'step', self.record_step)
+        self.reset()
+        return self
+
+    def detach(self):
+        # Drop the instance attributes so the class methods show through again
+        for name in ('pop', 'put', 'delete'):
+            self.planner.frontier.__dict__.pop(name, None)
+        for name in ('_update', 'update_node', 'sense', 'compute_shortest_path', 'step'):
+            self.planner.__dict__.pop(name, None)
+        self.planner = None
+
+    def wrap(self, obj, name, make_wrapper):
+        setattr(obj, name, make_wrapper(getattr(obj, name)))
+
+    def count(self, counter):
+        def make_wrapper(method):
+            def wrapper(*args, **kwargs):
+                self.current[counter] += 1
+                return method(*args, **kwargs)
+            return wrapper
+        return make_wrapper
+
+    def count_push(self, method):
+        frontier = self.planner.frontier
+        def wrapper(*args, **kwargs):
+            current = self.current
+            current['pushes'] += 1
+            result = method(*args, **kwargs)
+            if len(frontier) > current['peak_frontier']:
+                current['peak_frontier'] = len(frontier)
+            return result
+        return wrapper
+
+    def timer(self, counter):
+        def make_wrapper(method):
+            def wrapper(*args, **kwargs):
+                began = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    self.current[counter] += time.perf_counter() - began
+            return wrapper
+        return make_wrapper
+
+    def record_step(self, method):
+        def wrapper(*args, **kwargs):
+            began = time.perf_counter()
+            result = method(*args, **kwargs)
+            self.current['step_time'] += time.perf_counter() - began
+            record = StepStats(len(self.steps), self.planner.position, result.replanned,
+                               **self.current)
+            self.steps.append(record)
+            self.reset()
+            if self.on_step:
+                self.on_step(record)
+            return result
+        return wrapper
+
+    def totals(self):
+        totals = dict.fromkeys(COUNTERS, 0)
+        for record in self.steps:
+            for counter in COUNTERS:
+                if counter == 'peak_frontier':
+                    totals[counter] = max(totals[counter], record.peak_frontier)
+                else:
+                    totals[counter] += getattr(record, counter)
+        return RunStats(len(self.steps), sum(1 for r in self.steps if r.replanned), **totals)
+
+def profile_scenario(scenario, view_range = 2, eightway = True, backend = 'dict',
+                     max_steps = None, incremental = False):
+    """
+    Run a scenario like simulation.run_scenario with every planner attached
+    to a PlannerStats. Returns the PlannerStats (one per robot) and the error
+    that stopped the run, if any.
+    """
+    if max_steps is None:
+        max_steps = scenario.width * scenario.height
+    planners = build_planners(scenario, view_range, eightway, backend, incremental)
+    stats = [PlannerStats().attach(dstar) for dstar in planners]
+    error = run_ticks(planners, max_steps)
+    for s in stats:
+        s.detach()
+    return stats, error
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Count and time D* Lite planner work")
+    parser.add_argument('--width', type = int, default = 15)
+    parser.add_argument('--height', type = int, default = 15)
+    parser.add_argument('--robots', type = int, default = 2)
+    parser.add_argument('--density', type = float, default = None)
+    parser.add_argument('--view-range', type = int, default = 2)
+    parser.add_argument('--runs', type = int, default = 10)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--backend', choices = sorted(BACKENDS), default = 'dict')
+    parser.add_argument('--fourway', action = 'store_true')
+    parser.add_argument('--incremental', action = 'store_true')
+    parser.add_argument('--steps', action = 'store_true',
+                        help = "one row per robot step instead of per robot run")
+    args = parser.parse_args()
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['seed', 'robot'] + list((StepStats if args.steps else RunStats)._fields))
+    for seed in range(args.seed, args.seed + args.runs):
+        scenario = generate_scenario(args.width, args.height, args.robots, random.Random(seed),
+                                     args.density)
+        stats, error = profile_scenario(scenario, args.view_range, not args.fourway,
+                                        args.backend, incremental = args.incremental)
+        if error:
+            print("seed {}: {}".format(seed, error), file = sys.stderr)
+        for robot, s in enumerate(stats):
+            for record in (s.steps if args.steps else [s.totals()]):
+                writer.writerow([seed, robot] + list(record))
@@ -0,0 +1,142 @@
+"""
+Scenario sweeps across all cores. Each task builds its own scenario from a
+reproducible seed, so a sweep gives the same results whatever the number of
+workers or the order they finish in.
+
+    python sweep.py --width 40 --height 40 --robots 4 --runs 2000
+"""
+import argparse
+import csv
+import os
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from simulation import BACKENDS, RunMetrics, generate_scenario, run_scenario
+from scenario_io import ScenarioFile, load_scenario
+
+# With a scenario_file, seed is the index of the scenario in that file
+SweepTask = namedtuple('SweepTask', ['seed', 'width', 'height', 'num_robots',
+                                     'obstacle_density', 'view_range', 'eightway',
+                                     'backend', 'scenario_file'])
+
+SweepResult = namedtuple('SweepResult', ['metrics', 'optimal_cost'])
+
+def task_seeds(base_seed, num_runs):
+    """
+    Derive one 63-bit seed per task from base_seed.
+    """
+    seed_rng = random.Random(base_seed)
+    return [seed_rng.getrandbits(63) for i in range(num_runs)]
+
+def make_tasks(num_runs, width, height, num_robots, obstacle_density = None,
+               view_range = 2, eightway = True, backend = 'dict', base_seed = 0):
+    return [SweepTask(seed, width, height, num_robots, obstacle_density,
+                      view_range, eightway, backend, None)
+            for seed in task_seeds(base_seed, num_runs)]
+
+def file_tasks(path, view_range = 2, eightway = True, backend = 'dict'):
+    """
+    One task per scenario in a scenario file (see scenario_io.py). Workers
+    map the file themselves, so only the path and index are sent to them.
+    """
+    with ScenarioFile(path) as scenarios:
+        return [SweepTask(i, scenarios.width, scenarios.height, scenarios.num_robots, None,
+                          view_range, eightway, backend, path)
+                for i in range(len(scenarios))]
+
+def optimal_cost(graph, start, goal, planner_class):
+    """
+    Cost of the shortest start -> goal path with the whole map known up front.
+    """
+    dstar = planner_class(graph, start, goal)
+    dstar.graph.update_walls(graph.walls)
+    dstar.compute_shortest_path(return_stats = True)
+    return dstar.g(start)
+
+def run_task(task):
+    if task.scenario_file:
+        scenario = load_scenario(task.scenario_file, task.seed)
+    else:
+        scenario = generate_scenario(task.width, task.height, task.num_robots,
+                                     random.Random(task.seed), task.obstacle_density)
+    metrics = run_scenario(scenario, task.view_range, task.eightway, task.backend,
+                           seed = task.seed)
+
+    grid_class, planner_class = BACKENDS[task.backend]
+    graph = grid_class(task.width, task.height, task.eightway)
+    graph.walls.update(scenario.obstacles)
+    best = sum(optimal_cost(graph, start, goal, planner_class)
+               for start, goal in zip(scenario.starts, scenario.goals))
+    return SweepResult(metrics, best)
+
+def sweep(tasks, max_workers = None):
+    """
+    Run tasks in a process pool and yield SweepResults as they finish.
+    """
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(run_task, task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+def percentile(ordered, q):
+    if not ordered:
+        return float('nan')
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+def summarize(results):
+    """
+    Aggregate SweepResults into success rate, path-length ratio against the
+    full-knowledge optimum (successful runs only) and latency percentiles.
+    """
+    results = list(results)
+    succeeded = [r for r in results
+                 if r.metrics.error is None and r.metrics.reached == r.metrics.num_robots]
+    ratios = sorted(r.metrics.path_cost / r.optimal_cost for r in succeeded
+                    if 0 < r.optimal_cost < float('inf'))
+    latencies = sorted(r.metrics.wall_time for r in results)
+    return {
+        'runs': len(results),
+        'success_rate': len(succeeded) / len(results) if results else float('nan'),
+        'mean_path_ratio': sum(ratios) / len(ratios) if ratios else float('nan'),
+        'p50_path_ratio': percentile(ratios, 50),
+        'p50_latency': percentile(latencies, 50),
+        'p90_latency': percentile(latencies, 90),
+        'p99_latency': percentile(latencies, 99),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Sweep D* Lite scenarios across processes")
+    parser.add_argument('--width', type = int, default = 15)
+    parser.add_argument('--height', type = int, default = 15)
+    parser.add_argument('--robots', type = int, default = 2)
+    parser.add_argument('--density', type = float, default = None)
+    parser.add_argument('--view-range', type = int, default = 2)
+    parser.add_argument('--runs', type = int, default = 100)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--backend', choices = sorted(BACKENDS), default = 'dict')
+    parser.add_argument('--fourway', action = 'store_true')
+    parser.add_argument('--workers', type = int, default = os.cpu_count())
+    parser.add_argument('--csv', help = "also write every run's metrics to this file")
+    parser.add_argument('--scenarios', help = "run every scenario in this scenario file "
+                                              "instead of generating them")
+    args = parser.parse_args()
+
+    if args.scenarios:
+        tasks = file_tasks(args.scenarios, args.view_range, not args.fourway, args.backend)
+    else:
+        tasks = make_tasks(args.runs, args.width, args.height, args.robots, args.density,
+                           args.view_range, not args.fourway, args.backend, args.seed)
+    results = []
+    with (open(args.csv, 'w', newline = '') if args.csv else nullcontext()) as out:
+        writer = csv.writer(out) if out else None
+        if writer:
+            writer.writerow(('optimal_cost',) + RunMetrics._fields)
+        for result in sweep(tasks, args.workers):
+            results.append(result)
+            if writer:
+                writer.writerow((result.optimal_cost,) + tuple(result.metrics))
+
+    for key, value in summarize(results).items():
+        print("{}: {}".format(key, value))